@@ -26,6 +26,9 @@ MQTT_USER = os.environ.get("MQTT_USER")
 MQTT_PASSWORD = os.environ.get("MQTT_PASSWORD")
 MQTT_SERVER = os.environ.get("MQTT_SERVER")
 MQTT_QOS = int(os.environ.get("MQTT_QOS"))
+MODULE_SOURCE_CACHE_DIR = os.environ.get(
+    "MODULE_SOURCE_CACHE_DIR", "/tmp/ccdexplorer-api/module-sources"
+)
 
 environment = {
     "SITE_URL": SITE_URL,
@@ -0,0 +1,26 @@
+from enum import Enum
+
+
+class CollectionsAPI(Enum):
+    """
+    Collections that are owned and maintained by the API itself.
+    They live next to the collections from `ccdexplorer_fundamentals`
+    in the database for the net.
+    """
+
+    cis_standards_support = "api_cis_standards_support"
+    rollup_state = "api_rollup_state"
+    module_usage_per_day = "api_module_usage_per_day"
+    account_rewards_per_day = "api_account_rewards_per_day"
+    account_creations = "api_account_creations"
+    account_aliases = "api_account_aliases"
+    account_token_contracts = "api_account_token_contracts"
+    today_in_reports = "api_today_in_reports"
+    today_in_impacted_addresses = "api_today_in_impacted_addresses"
+
+
+def get_api_db(mongo, net: str):
+    """
+    Returns the raw database for the net, for both MongoDB and MongoMotor.
+    """
+    return mongo.testnet_db if net == "testnet" else mongo.mainnet_db
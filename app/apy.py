@@ -0,0 +1,104 @@
+import asyncio
+from typing import NamedTuple
+
+from ccdexplorer_fundamentals.enums import NET
+from ccdexplorer_fundamentals.GRPCClient import GRPCClient
+from ccdexplorer_fundamentals.GRPCClient.CCD_Types import CCD_PassiveDelegationInfo
+from ccdexplorer_fundamentals.mongodb import Collections, MongoMotor
+
+from app.cache import LRUCache
+from app.paydays import get_current_payday_key
+
+APY_PERIODS = ["d30", "d90", "d180"]
+# APY data is written some time after a payday, so a lookup built right after
+# the payday is built again after this many seconds.
+APY_LOOKUP_RECHECK_IN_SECONDS = 900
+
+
+class ApyLookup(NamedTuple):
+    # account address, validator id or "passive_delegation" to the latest
+    # d30/d90/d180 APY entries.
+    apy: dict[str, dict]
+    passive_delegation_info: CCD_PassiveDelegationInfo
+
+
+apy_lookup_cache = LRUCache(maxsize=4, ttl=APY_LOOKUP_RECHECK_IN_SECONDS)
+# full APY documents, per payday.
+apy_object_cache = LRUCache(maxsize=1_000, ttl=APY_LOOKUP_RECHECK_IN_SECONDS)
+
+
+def empty_apy() -> dict:
+    return {period: {"sum_of_rewards": 0, "apy": 0} for period in APY_PERIODS}
+
+
+async def build_apy_lookup(
+    mongomotor: MongoMotor, grpcclient: GRPCClient, net: str
+) -> ApyLookup:
+    """
+    Resolve the latest entry of each APY dict for all ids in one aggregation.
+    The APY dicts are keyed on date, in order, so the latest entry is the last.
+    """
+    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
+    pipeline = [
+        {
+            "$project": {
+                period: {
+                    "$getField": {
+                        "field": "v",
+                        "input": {"$last": {"$objectToArray": f"${period}_apy_dict"}},
+                    }
+                }
+                for period in APY_PERIODS
+            }
+        }
+    ]
+    apy = {}
+    async for x in db_to_use[Collections.paydays_apy_intermediate].aggregate(pipeline):
+        resolved = empty_apy()
+        for period in APY_PERIODS:
+            if x.get(period) is not None:
+                resolved[period] = x[period]
+        apy[str(x["_id"])] = resolved
+
+    passive_delegation_info = await asyncio.to_thread(
+        grpcclient.get_passive_delegation_info, "last_final", net=NET(net)
+    )
+    return ApyLookup(apy, passive_delegation_info)
+
+
+async def get_apy_lookup(
+    mongomotor: MongoMotor, grpcclient: GRPCClient, net: str
+) -> ApyLookup:
+    """
+    The APY lookup for the current payday, built once per payday.
+    """
+    payday_key = await get_current_payday_key(grpcclient, net)
+
+    async def load():
+        return await build_apy_lookup(mongomotor, grpcclient, net)
+
+    return await apy_lookup_cache.get_or_load((net, payday_key), load)
+
+
+def lookup_apy(apy_lookup: ApyLookup, id: str | int) -> dict:
+    """
+    The latest d30/d90/d180 APY entries for an account address, validator id
+    or "passive_delegation", zero if there is no APY data for it.
+    """
+    return apy_lookup.apy.get(str(id)) or empty_apy()
+
+
+async def get_apy_object(
+    mongomotor: MongoMotor, grpcclient: GRPCClient, id: str
+) -> dict | None:
+    """
+    The full (mainnet) APY document for an id, with all history, kept per payday.
+    """
+    payday_key = await get_current_payday_key(grpcclient, "mainnet")
+
+    async def load():
+        return await mongomotor.mainnet[Collections.paydays_apy_intermediate].find_one(
+            {"_id": {"$eq": id}}
+        )
+
+    return await apy_object_cache.get_or_load((payday_key, id), load)
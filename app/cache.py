@@ -0,0 +1,99 @@
+import asyncio
+import datetime as dt
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Bounded in-process cache with least-recently-used eviction.
+
+    Entries can carry a time-to-live. A value of `None` is cached as well
+    (negative caching), using `negative_ttl` if given, so repeated lookups
+    for things that do not exist don't hit the database every time.
+    Concurrent `get_or_load` calls for the same key share a single load.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10_000,
+        ttl: Optional[float] = None,
+        negative_ttl: Optional[float] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl if negative_ttl is not None else ttl
+        self._data: OrderedDict[Hashable, tuple[Any, Optional[dt.datetime]]] = (
+            OrderedDict()
+        )
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key)[0]
+
+    def _lookup(self, key: Hashable) -> tuple[bool, Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at = entry
+        if expires_at and expires_at < dt.datetime.now(dt.timezone.utc):
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        found, value = self._lookup(key)
+        return value if found else default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        expires_at = (
+            dt.datetime.now(dt.timezone.utc) + dt.timedelta(seconds=ttl)
+            if ttl
+            else None
+        )
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    async def get_or_load(
+        self, key: Hashable, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        found, value = self._lookup(key)
+        if found:
+            return value
+
+        if key in self._inflight:
+            # a waiter that is cancelled must not cancel the shared load.
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as error:
+            # waiters are released on any failure, including cancellation.
+            if isinstance(error, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(error)
+                # make sure an unawaited future doesn't log a warning
+                future.exception()
+            raise
+        finally:
+            del self._inflight[key]
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+from typing import NamedTuple
+
+from ccdexplorer_fundamentals.mongodb import CollectionsUtilities, MongoMotor
+from fastapi.responses import JSONResponse
+
+from app.projects import get_project_registry
+
+
+class LabelSnapshot(NamedTuple):
+    # content hash of both bodies, used as ETag.
+    version: str
+    # prebuilt response bodies for the labeled accounts routes.
+    labeled_accounts_body: bytes
+    community_labeled_accounts_body: bytes
+    # address, account index or contract address to label, group and color.
+    labels: dict[str | int, dict]
+    # the same labels for account addresses, by canonical address (for aliases).
+    labels_by_canonical_address: dict[str, dict]
+
+
+label_snapshot: LabelSnapshot | None = None
+label_snapshot_lock = asyncio.Lock()
+
+
+async def build_label_snapshot(mongomotor: MongoMotor) -> LabelSnapshot:
+    """
+    Read the label sources (labeled accounts and their metadata from utilities,
+    projects from the mainnet project registry) once and build both response bodies
+    and the label index from them. Labels only exist for mainnet, so one
+    snapshot serves both nets.
+    """
+    db_utilities = mongomotor.utilities
+
+    labeled_accounts_result, metadata_result, registry = await asyncio.gather(
+        db_utilities[CollectionsUtilities.labeled_accounts].find({}).to_list(None),
+        db_utilities[CollectionsUtilities.labeled_accounts_metadata]
+        .find({})
+        .to_list(None),
+        get_project_registry(mongomotor, "mainnet"),
+    )
+
+    colors = {}
+    descriptions = {}
+    for r in metadata_result:
+        colors[r["_id"]] = r.get("color")
+        descriptions[r["_id"]] = r.get("description")
+
+    # labels by address
+    labeled_accounts = {}
+    # labels by account index (if known), for the community labels
+    community_labeled_accounts = {}
+    for r in labeled_accounts_result:
+        labeled_accounts.setdefault(r["label_group"], {})[r["_id"]] = r["label"]
+        community_labeled_accounts.setdefault(r["label_group"], {})[
+            r.get("account_index", r["_id"])
+        ] = r["label"]
+
+    ### insert projects into tags
+    projects_display_names = {
+        x["_id"]: x["display_name"] for x in registry.projects.values()
+    }
+    project_accounts = {}
+    for addresses in registry.addresses_by_project.values():
+        for paa in addresses:
+            display_name = projects_display_names[paa["project_id"]]
+            if paa["type"] == "account_address":
+                project_accounts[paa["account_index"]] = display_name
+            elif paa["type"] == "contract_address":
+                community_labeled_accounts.setdefault("contracts", {})[
+                    paa["contract_address"]
+                ] = display_name
+
+    labels_melt = {}
+    for label_group, group in [
+        *community_labeled_accounts.items(),
+        ("projects", project_accounts),
+    ]:
+        for address, tag in group.items():
+            labels_melt[address] = {
+                "label": tag,
+                "group": label_group,
+                "color": colors.get(label_group),
+            }
+
+    labeled_accounts_body = JSONResponse(
+        {
+            "labels": labeled_accounts,
+            "colors": colors,
+            "descriptions": descriptions,
+        }
+    ).body
+    community_labeled_accounts_body = JSONResponse(
+        {
+            "labels_melt": labels_melt,
+            "labeled_accounts": community_labeled_accounts,
+            "colors": colors,
+            "descriptions": descriptions,
+        }
+    ).body
+
+    # the label index also knows labeled accounts by address.
+    labels = dict(labels_melt)
+    for label_group, group in labeled_accounts.items():
+        for address, tag in group.items():
+            labels.setdefault(
+                address,
+                {"label": tag, "group": label_group, "color": colors.get(label_group)},
+            )
+
+    labels_by_canonical_address = {}
+    for address, label in labels.items():
+        if isinstance(address, str) and len(address) == 50:
+            labels_by_canonical_address.setdefault(address[:29], label)
+
+    version = hashlib.sha256(
+        labeled_accounts_body + b"\n" + community_labeled_accounts_body
+    ).hexdigest()[:32]
+    return LabelSnapshot(
+        version,
+        labeled_accounts_body,
+        community_labeled_accounts_body,
+        labels,
+        labels_by_canonical_address,
+    )
+
+
+async def refresh_label_snapshot(mongomotor: MongoMotor) -> LabelSnapshot:
+    """
+    Rebuild the snapshot. The current snapshot (and its version) is only
+    replaced if any of the sources changed.
+    """
+    global label_snapshot
+    async with label_snapshot_lock:
+        snapshot = await build_label_snapshot(mongomotor)
+        if label_snapshot is None or label_snapshot.version != snapshot.version:
+            label_snapshot = snapshot
+    return label_snapshot
+
+
+async def get_label_snapshot(mongomotor: MongoMotor) -> LabelSnapshot:
+    if label_snapshot is not None:
+        return label_snapshot
+    return await refresh_label_snapshot(mongomotor)
+
+
+def get_label(address: str | int) -> dict | None:
+    """
+    Label, group and color for an account address (or its alias), account
+    index or contract address, from the current snapshot. For annotating
+    addresses inline, without a database read.
+    """
+    if label_snapshot is None:
+        return None
+    if address in label_snapshot.labels:
+        return label_snapshot.labels[address]
+    if isinstance(address, str) and len(address) == 50:
+        return label_snapshot.labels_by_canonical_address.get(address[:29])
+    return None
@@ -1,5 +1,6 @@
 # ruff: noqa: F403, F405, E402, E501, E722, F401
 
+import asyncio
 import datetime as dt
 from contextlib import asynccontextmanager
 from datetime import timedelta
@@ -77,6 +78,10 @@ from ratelimit.types import ASGIApp, Receive, Scope, Send
 from redis.asyncio import StrictRedis
 
 from app.ratelimiting import AUTH_FUNCTION, handle_429, handle_auth_error
+from app.labels import refresh_label_snapshot
+from app.nodes_validators import refresh_nodes_validators_snapshot
+from app.projects import mark_project_registries_stale, refresh_project_registries
+from app.rollups import run_rollups
 
 if environment["SITE_URL"] != "http://127.0.0.1:8000":
     sentry_sdk.init(
@@ -103,6 +108,8 @@ def on_message(client, userdata, message: Message):
         grpcclient.connection_info(f"API on {RUN_ON_NET}", tooter, ADMIN_CHAT_ID)
     if "keys" in message.topic:
         save_api_keys_for_topic(mongodb=mongodb, app=app, for_="MQTT topic")
+    if "projects" in message.topic:
+        mark_project_registries_stale()
 
 
 mqttc = mqtt.Client(
@@ -142,8 +149,55 @@ async def lifespan(app: FastAPI):
     app.exchange_rates = None
     app.blocks_per_day = None
 
+    try:
+        await refresh_project_registries(motormongo, force=True)
+    except Exception as error:
+        print(f"Loading project registries failed: {error}")
+
+    @repeat_every(seconds=60)
+    async def maintain_project_registries():
+        try:
+            await refresh_project_registries(motormongo)
+        except Exception as error:
+            print(f"Project registries failed: {error}")
+
+    app.projects_task = asyncio.create_task(maintain_project_registries())
+
+    @repeat_every(seconds=60)
+    async def maintain_rollups():
+        try:
+            await run_rollups(motormongo)
+        except Exception as error:
+            print(f"Rollups failed: {error}")
+
+    app.rollups_task = asyncio.create_task(maintain_rollups())
+
+    @repeat_every(seconds=60)
+    async def maintain_label_snapshot():
+        try:
+            await refresh_label_snapshot(motormongo)
+        except Exception as error:
+            print(f"Label snapshot failed: {error}")
+
+    app.label_snapshot_task = asyncio.create_task(maintain_label_snapshot())
+
+    @repeat_every(seconds=15)
+    async def maintain_nodes_validators_snapshot():
+        for net in ["mainnet", "testnet"]:
+            try:
+                await refresh_nodes_validators_snapshot(motormongo, net)
+            except Exception as error:
+                print(f"Nodes and validators snapshot for {net} failed: {error}")
+
+    app.nodes_validators_task = asyncio.create_task(
+        maintain_nodes_validators_snapshot()
+    )
+
     yield
-    pass
+    app.rollups_task.cancel()
+    app.label_snapshot_task.cancel()
+    app.nodes_validators_task.cancel()
+    app.projects_task.cancel()
 
 
 tags_metadata = [
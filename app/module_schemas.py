@@ -0,0 +1,73 @@
+import asyncio
+from typing import Literal
+
+from ccdexplorer_fundamentals.GRPCClient import GRPCClient
+from ccdexplorer_schema_parser.Schema import Schema
+from pydantic import BaseModel
+
+from app.cache import LRUCache
+from app.module_sources import module_source_store
+
+
+class DecodeRequest(BaseModel):
+    kind: Literal["parameter", "return_value", "event"]
+    contract_name: str
+    # the receive function, not used for events
+    function_name: str | None = None
+    # hex encoded bytes
+    data: str
+
+
+class ModuleSchemaStore:
+    """
+    Parsed schemas per module ref.
+
+    Extracting the schema from a module means parsing the full Wasm module,
+    so this is done once per module ref and the parsed schema is kept in an
+    LRU. A module without an embedded schema is remembered as `None`.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.cache = LRUCache(maxsize=maxsize)
+
+    async def get(
+        self, grpcclient: GRPCClient, net: str, module_ref: str
+    ) -> Schema | None:
+        async def load():
+            module_source = await module_source_store.get(grpcclient, net, module_ref)
+            version = 1 if module_source.version == "v1" else 0
+            schema = await asyncio.to_thread(Schema, module_source.source, version)
+            return schema if schema.schema else None
+
+        return await self.cache.get_or_load(module_ref, load)
+
+
+def decode_with_schema(schema: Schema, req: DecodeRequest):
+    """
+    Decode a single parameter, return value or event against a parsed schema.
+    Raises `ValueError` if the data can't be decoded.
+    """
+    if req.kind != "event" and not req.function_name:
+        raise ValueError(f"A function name is required to decode a {req.kind}.")
+
+    try:
+        data = bytes.fromhex(req.data)
+        if req.kind == "event":
+            result = schema.event_to_json(req.contract_name, data)
+        elif req.kind == "parameter":
+            result = schema.parameter_to_json(
+                req.contract_name, req.function_name, data
+            )
+        else:
+            result = schema.return_value_to_json(
+                req.contract_name, req.function_name, data
+            )
+    except Exception as _:
+        result = None
+
+    if result is None:
+        raise ValueError(f"Could not decode {req.kind} with the module schema.")
+    return result
+
+
+module_schema_store = ModuleSchemaStore()
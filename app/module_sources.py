@@ -0,0 +1,132 @@
+import json
+import base64
+import os
+import re
+from pathlib import Path
+from typing import NamedTuple
+
+from ccdexplorer_fundamentals.enums import NET
+from ccdexplorer_fundamentals.GRPCClient import GRPCClient
+from ccdexplorer_fundamentals.GRPCClient.types_pb2 import VersionedModuleSource
+
+from app.cache import LRUCache
+from app.ENV import MODULE_SOURCE_CACHE_DIR
+
+# a module ref is the hex encoded SHA-256 hash of the module.
+MODULE_REF_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+class ModuleSource(NamedTuple):
+    version: str
+    source: bytes
+    # the `module_source` value as it appears in a response body, already
+    # base64 encoded and JSON encoded (twice, as the API always did).
+    encoded: bytes
+
+
+class ModuleSourceStore:
+    """
+    Content-addressed store for module sources.
+
+    A module ref is the hash of the module, so a source never changes and is
+    the same on every net. Raw module bytes and the encoded response fragment
+    are written to disk once, with an in-process LRU on top for the modules
+    that are requested most.
+    """
+
+    def __init__(self, directory: str, maxsize: int = 128):
+        self.directory = Path(directory)
+        self.cache = LRUCache(maxsize=maxsize)
+
+    @staticmethod
+    def check_module_ref(module_ref: str):
+        """
+        Module refs come from the URL and end up in a path, so anything that
+        is not a module ref is refused with a `ValueError`.
+        """
+        if not MODULE_REF_PATTERN.fullmatch(module_ref):
+            raise ValueError(f"{module_ref} is not a module ref.")
+
+    def _path(self, module_ref: str, suffix: str) -> Path:
+        self.check_module_ref(module_ref)
+        return self.directory / module_ref[:2] / f"{module_ref}.{suffix}"
+
+    @staticmethod
+    def _write(path: Path, content: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def encode(source: bytes) -> bytes:
+        return json.dumps(json.dumps(base64.encodebytes(source).decode())).encode()
+
+    def read_from_disk(self, module_ref: str) -> ModuleSource | None:
+        for version in ["v1", "v0"]:
+            source_path = self._path(module_ref, f"{version}.wasm")
+            if source_path.exists():
+                encoded_path = self._path(module_ref, f"{version}.json")
+                source = source_path.read_bytes()
+                if encoded_path.exists():
+                    encoded = encoded_path.read_bytes()
+                else:
+                    encoded = self.encode(source)
+                    self._write(encoded_path, encoded)
+                return ModuleSource(version, source, encoded)
+        return None
+
+    def write_to_disk(self, module_ref: str, module_source: ModuleSource):
+        self._write(
+            self._path(module_ref, f"{module_source.version}.wasm"),
+            module_source.source,
+        )
+        self._write(
+            self._path(module_ref, f"{module_source.version}.json"),
+            module_source.encoded,
+        )
+
+    async def get(
+        self, grpcclient: GRPCClient, net: str, module_ref: str
+    ) -> ModuleSource:
+        """
+        Get the source for a module ref, from memory, disk or the node, in that order.
+        Errors from the node are raised and nothing is cached for them, as is
+        a `ValueError` for anything that is not a module ref.
+        """
+        self.check_module_ref(module_ref)
+
+        async def load():
+            module_source = self.read_from_disk(module_ref)
+            if module_source:
+                return module_source
+
+            ms: VersionedModuleSource = grpcclient.get_module_source_original_classes(
+                module_ref, "last_final", net=NET(net)
+            )
+            version = "v1" if ms.v1 else "v0"
+            source = ms.v1.value if ms.v1 else ms.v0.value
+            module_source = ModuleSource(version, source, self.encode(source))
+            self.write_to_disk(module_ref, module_source)
+            return module_source
+
+        return await self.cache.get_or_load(module_ref, load)
+
+
+def module_source_response_body(
+    module_source: ModuleSource, source_module_name: str | None = None
+) -> bytes:
+    """
+    Assemble the JSON response body around the precomputed encoded source,
+    so large modules are never encoded again.
+    """
+    parts = []
+    if source_module_name is not None:
+        parts.append(b'"source_module_name":' + json.dumps(source_module_name).encode())
+    parts.append(b'"module_source":' + module_source.encoded)
+    parts.append(b'"version":' + json.dumps(module_source.version).encode())
+    return b"{" + b",".join(parts) + b"}"
+
+
+module_source_store = ModuleSourceStore(MODULE_SOURCE_CACHE_DIR)
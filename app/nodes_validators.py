@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import json
+from typing import NamedTuple
+
+import bson
+from ccdexplorer_fundamentals.mongodb import Collections, MongoMotor
+from ccdexplorer_fundamentals.node import ConcordiumNodeFromDashboard
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+NODES_VALIDATORS_MAPS = [
+    "all_nodes_by_node_id",
+    "all_validators_by_validator_id",
+    "validator_nodes_by_account_id",
+    "non_validator_nodes_by_node_id",
+    "non_reporting_validators_by_validator_id",
+    "non_reporting_validators_by_account_id",
+]
+
+
+class NodesValidatorsSnapshot(NamedTuple):
+    # hash of the source documents, the snapshot is only rebuilt if it changes.
+    fingerprint: str
+    # the JSON encoded value of each map, by map name.
+    maps: dict[str, bytes]
+
+
+nodes_validators_snapshots: dict[str, NodesValidatorsSnapshot] = {}
+nodes_validators_lock = asyncio.Lock()
+
+
+def build_nodes_and_validators(
+    net: str, all_nodes: list[dict], all_validators: list[dict]
+) -> dict:
+    all_nodes_by_node_id = {x["nodeId"]: x for x in all_nodes}
+    result_dict = {"all_nodes_by_node_id": all_nodes_by_node_id}
+    if net != "mainnet":
+        return result_dict
+
+    all_validators_by_validator_id = {x["baker_id"]: x for x in all_validators}
+    # every node model is constructed once.
+    nodes = {
+        x["nodeId"]: {"node": ConcordiumNodeFromDashboard(**x), "validator": None}
+        for x in all_nodes
+    }
+
+    validator_nodes_by_validator_id = {}
+    validator_nodes_by_account_id = {}
+    non_validator_nodes_by_node_id = {}
+    for x in all_nodes:
+        if x["consensusBakerId"] is None:
+            non_validator_nodes_by_node_id[x["nodeId"]] = nodes[x["nodeId"]]
+        elif str(x["consensusBakerId"]) in all_validators_by_validator_id:
+            validator = all_validators_by_validator_id[str(x["consensusBakerId"])]
+            validator_node = {
+                "node": nodes[x["nodeId"]]["node"],
+                "validator": validator,
+            }
+            validator_nodes_by_validator_id[x["consensusBakerId"]] = validator_node
+            validator_nodes_by_account_id[validator["pool_status"]["address"]] = (
+                validator_node
+            )
+
+    non_reporting_validators_by_validator_id = {}
+    non_reporting_validators_by_account_id = {}
+    for x in all_validators:
+        if x["baker_id"] not in validator_nodes_by_validator_id:
+            validator = all_validators_by_validator_id[str(x["baker_id"])]
+            non_reporting_validators_by_validator_id[x["baker_id"]] = {
+                "node": None,
+                "validator": validator,
+            }
+            non_reporting_validators_by_account_id[
+                validator["pool_status"]["address"]
+            ] = {"node": None, "validator": validator}
+
+    result_dict.update(
+        {
+            "all_validators_by_validator_id": all_validators_by_validator_id,
+            "validator_nodes_by_account_id": validator_nodes_by_account_id,
+            "non_validator_nodes_by_node_id": non_validator_nodes_by_node_id,
+            "non_reporting_validators_by_validator_id": non_reporting_validators_by_validator_id,
+            "non_reporting_validators_by_account_id": non_reporting_validators_by_account_id,
+        }
+    )
+    return result_dict
+
+
+async def refresh_nodes_validators_snapshot(
+    mongomotor: MongoMotor, net: str
+) -> NodesValidatorsSnapshot:
+    """
+    Read the node dashboard and current payday validators, and only when they
+    changed since the last snapshot, rebuild the maps and serialize each of them.
+    """
+    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
+    async with nodes_validators_lock:
+        all_nodes = (
+            await db_to_use[Collections.dashboard_nodes].find({}).to_list(length=None)
+        )
+        # validators are only shown for mainnet.
+        all_validators = (
+            await db_to_use[Collections.paydays_current_payday]
+            .find({})
+            .to_list(length=None)
+            if net == "mainnet"
+            else []
+        )
+        fingerprint = hashlib.sha256()
+        for x in [*all_nodes, *all_validators]:
+            fingerprint.update(bson.encode(x))
+        fingerprint = fingerprint.hexdigest()
+
+        snapshot = nodes_validators_snapshots.get(net)
+        if snapshot and snapshot.fingerprint == fingerprint:
+            return snapshot
+
+        def build_maps() -> dict[str, bytes]:
+            result_dict = build_nodes_and_validators(net, all_nodes, all_validators)
+            return {
+                name: JSONResponse(jsonable_encoder(value)).body
+                for name, value in result_dict.items()
+            }
+
+        snapshot = NodesValidatorsSnapshot(
+            fingerprint, await asyncio.to_thread(build_maps)
+        )
+        nodes_validators_snapshots[net] = snapshot
+        return snapshot
+
+
+async def get_nodes_validators_snapshot(
+    mongomotor: MongoMotor, net: str
+) -> NodesValidatorsSnapshot:
+    if net in nodes_validators_snapshots:
+        return nodes_validators_snapshots[net]
+    return await refresh_nodes_validators_snapshot(mongomotor, net)
+
+
+def nodes_validators_response_body(
+    snapshot: NodesValidatorsSnapshot, maps: list[str]
+) -> bytes:
+    """
+    Assemble the JSON response body from the serialized maps that are asked for.
+    """
+    parts = [
+        json.dumps(name).encode() + b":" + snapshot.maps[name]
+        for name in maps
+        if name in snapshot.maps
+    ]
+    return b"{" + b",".join(parts) + b"}"
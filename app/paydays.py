@@ -0,0 +1,178 @@
+import asyncio
+import datetime as dt
+from bisect import bisect_left
+from typing import NamedTuple
+
+from ccdexplorer_fundamentals.enums import NET
+from ccdexplorer_fundamentals.GRPCClient import GRPCClient
+from ccdexplorer_fundamentals.mongodb import Collections
+
+from app.cache import LRUCache
+
+# while a payday is due but not yet finalized, check again this often.
+PAYDAY_RECHECK_IN_SECONDS = 5
+
+next_payday_time_cache = LRUCache(maxsize=2)
+
+
+async def get_next_payday_time(grpcclient: GRPCClient, net: str) -> dt.datetime:
+    """
+    The time of the next payday on the net. It is only asked from the node
+    again once that time has passed, so it is cheap to call on every request.
+    """
+    if net in next_payday_time_cache:
+        return next_payday_time_cache.get(net)
+
+    tokenomics_info = grpcclient.get_tokenomics_info("last_final", net=NET(net))
+    next_payday_time = tokenomics_info.v1.next_payday_time
+    seconds_to_payday = (
+        next_payday_time - dt.datetime.now().astimezone(dt.timezone.utc)
+    ).total_seconds()
+    next_payday_time_cache.set(
+        net, next_payday_time, ttl=max(seconds_to_payday, PAYDAY_RECHECK_IN_SECONDS)
+    )
+    return next_payday_time
+
+
+async def get_current_payday_key(grpcclient: GRPCClient, net: str) -> str:
+    """
+    Identifies the current payday (reward period): it changes exactly when a
+    payday happens. Use it in cache keys for data that is fixed per payday.
+    """
+    return f"{await get_next_payday_time(grpcclient, net):%Y-%m-%dT%H:%M:%S}"
+
+
+class Payday(NamedTuple):
+    # the hash and height of the payday block, the block with the rewards.
+    hash: str
+    height: int
+    date: str
+
+
+class PaydayIndex:
+    """
+    All paydays of a net, sorted on the height of the payday block, so finding
+    out whether a block is a payday block is a bisect in memory. Paydays are
+    added incrementally, at most every `refresh_interval` seconds, and only
+    when a block after the last known payday is asked for.
+    """
+
+    def __init__(self, refresh_interval: float = 10):
+        self.refresh_interval = refresh_interval
+        self.heights: list[int] = []
+        self.by_height: dict[int, Payday] = {}
+        self.by_hash: dict[str, Payday] = {}
+        self.refreshed_at: dt.datetime | None = None
+        self.lock = asyncio.Lock()
+
+    def _is_stale(self) -> bool:
+        return (
+            self.refreshed_at is None
+            or (
+                dt.datetime.now().astimezone(dt.timezone.utc) - self.refreshed_at
+            ).total_seconds()
+            > self.refresh_interval
+        )
+
+    async def refresh(self, db_to_use):
+        async with self.lock:
+            if not self._is_stale():
+                return
+            last_height = self.heights[-1] if self.heights else -1
+            for x in (
+                await db_to_use[Collections.paydays]
+                .find(
+                    {"height_for_last_block": {"$gte": last_height}},
+                    {"_id": 1, "date": 1, "height_for_last_block": 1},
+                )
+                .to_list(length=None)
+            ):
+                payday = Payday(x["_id"], x["height_for_last_block"] + 1, x["date"])
+                if payday.height not in self.by_height:
+                    self.by_height[payday.height] = payday
+                    self.by_hash[payday.hash] = payday
+            self.heights = sorted(self.by_height.keys())
+            self.refreshed_at = dt.datetime.now().astimezone(dt.timezone.utc)
+
+    async def find(self, db_to_use, height_or_hash: int | str) -> Payday | None:
+        """
+        The payday for a payday block (by height or hash), otherwise `None`.
+        """
+        if isinstance(height_or_hash, int):
+            if not self.heights or height_or_hash > self.heights[-1]:
+                if self._is_stale():
+                    await self.refresh(db_to_use)
+            i = bisect_left(self.heights, height_or_hash)
+            if i < len(self.heights) and self.heights[i] == height_or_hash:
+                return self.by_height[height_or_hash]
+            return None
+
+        if height_or_hash not in self.by_hash and self._is_stale():
+            await self.refresh(db_to_use)
+        return self.by_hash.get(height_or_hash)
+
+    def is_latest(self, payday: Payday) -> bool:
+        return bool(self.heights) and payday.height == self.heights[-1]
+
+
+payday_indexes: dict[str, PaydayIndex] = {}
+# reward counts for a payday, the latest payday may still be written to.
+payday_reward_counts_cache = LRUCache(maxsize=10_000)
+
+
+def get_payday_index(db_to_use) -> PaydayIndex:
+    key = db_to_use[Collections.paydays].full_name
+    if key not in payday_indexes:
+        payday_indexes[key] = PaydayIndex()
+    return payday_indexes[key]
+
+
+async def get_payday_reward_counts(db_to_use, payday: Payday) -> dict[str, int]:
+    """
+    The number of pool rewards and account rewards for a payday, with one `$group`.
+    """
+    key = (db_to_use[Collections.paydays_rewards].full_name, payday.date)
+    if key in payday_reward_counts_cache:
+        return payday_reward_counts_cache.get(key)
+
+    result = (
+        await db_to_use[Collections.paydays_rewards]
+        .aggregate(
+            [
+                {"$match": {"date": payday.date}},
+                {
+                    "$group": {
+                        "_id": None,
+                        "count_of_pool_rewards": {
+                            "$sum": {
+                                "$cond": [
+                                    {"$eq": [{"$type": "$pool_owner"}, "missing"]},
+                                    0,
+                                    1,
+                                ]
+                            }
+                        },
+                        "count_of_account_rewards": {
+                            "$sum": {
+                                "$cond": [
+                                    {"$eq": [{"$type": "$account_id"}, "missing"]},
+                                    0,
+                                    1,
+                                ]
+                            }
+                        },
+                    }
+                },
+            ]
+        )
+        .to_list(length=None)
+    )
+    counts = {
+        "count_of_account_rewards": (
+            result[0]["count_of_account_rewards"] if result else 0
+        ),
+        "count_of_pool_rewards": result[0]["count_of_pool_rewards"] if result else 0,
+    }
+    latest = get_payday_index(db_to_use).is_latest(payday)
+    payday_reward_counts_cache.set(key, counts, ttl=60 if latest else None)
+    return counts
@@ -0,0 +1,177 @@
+import asyncio
+import datetime as dt
+from typing import NamedTuple
+
+from ccdexplorer_fundamentals.GRPCClient.CCD_Types import CCD_BlockItemSummary
+from ccdexplorer_fundamentals.mongodb import (
+    Collections,
+    CollectionsUtilities,
+    MongoMotor,
+)
+
+# projects rarely change and a change is signalled over MQTT, this is a fallback.
+PROJECT_REGISTRY_MAX_AGE_IN_SECONDS = 600
+# the fields in a project address document that identify the address.
+PROJECT_ADDRESS_FIELDS = [
+    "account_address",
+    "account_index",
+    "contract_address",
+    "module_ref",
+]
+
+
+class ProjectRegistry(NamedTuple):
+    # project id to project, from utilities (the same for both nets).
+    projects: dict[str, dict]
+    # project id to the project address documents on the net.
+    addresses_by_project: dict[str, list[dict]]
+    # account address (canonical), account index, contract address or module ref
+    # to project id.
+    project_by_address: dict[str | int, str]
+    loaded_at: dt.datetime
+
+
+project_registries: dict[str, ProjectRegistry] = {}
+# counts the change signals, the registries are stale while the count differs
+# from the count at the last successful load.
+project_registries_changes = 0
+project_registries_changes_loaded = 0
+project_registry_lock = asyncio.Lock()
+
+
+def address_key(address: str | int) -> str | int:
+    # aliases belong to the same project as their account.
+    if isinstance(address, str) and len(address) == 50:
+        return address[:29]
+    return address
+
+
+async def load_project_registry(mongomotor: MongoMotor, net: str) -> ProjectRegistry:
+    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
+    projects_result, project_addresses_result = await asyncio.gather(
+        mongomotor.utilities[CollectionsUtilities.projects]
+        .find({})
+        .to_list(length=None),
+        db_to_use[Collections.projects].find({}).to_list(length=None),
+    )
+    projects = {x["_id"]: x for x in projects_result}
+    addresses_by_project = {}
+    project_by_address = {}
+    for x in project_addresses_result:
+        addresses_by_project.setdefault(x["project_id"], []).append(x)
+        for field in PROJECT_ADDRESS_FIELDS:
+            if x.get(field) is not None:
+                project_by_address[address_key(x[field])] = x["project_id"]
+
+    return ProjectRegistry(
+        projects,
+        addresses_by_project,
+        project_by_address,
+        dt.datetime.now().astimezone(dt.timezone.utc),
+    )
+
+
+async def refresh_project_registries(mongomotor: MongoMotor, force: bool = False):
+    """
+    Reload the registries when a change was signalled, or when they are too old.
+    """
+    global project_registries_changes_loaded
+    now = dt.datetime.now().astimezone(dt.timezone.utc)
+    async with project_registry_lock:
+        changes = project_registries_changes
+        stale = changes != project_registries_changes_loaded
+        for net in ["mainnet", "testnet"]:
+            registry = project_registries.get(net)
+            if (
+                force
+                or stale
+                or registry is None
+                or (now - registry.loaded_at).total_seconds()
+                > PROJECT_REGISTRY_MAX_AGE_IN_SECONDS
+            ):
+                project_registries[net] = await load_project_registry(mongomotor, net)
+        # only after both nets have loaded, so a failed load is retried, and
+        # a change signalled during the load is picked up by the next refresh.
+        project_registries_changes_loaded = changes
+
+
+def mark_project_registries_stale():
+    """
+    Signal that projects changed. Safe to call from another thread (MQTT).
+    """
+    global project_registries_changes
+    project_registries_changes += 1
+
+
+async def get_project_registry(mongomotor: MongoMotor, net: str) -> ProjectRegistry:
+    if net not in project_registries:
+        async with project_registry_lock:
+            if net not in project_registries:
+                project_registries[net] = await load_project_registry(mongomotor, net)
+    return project_registries[net]
+
+
+def get_project_attribution(net: str, address: str | int) -> dict | None:
+    """
+    The project an account address (or alias), account index, contract address
+    or module ref belongs to, as `project_id` and `display_name`, from the loaded
+    registry. For attributing addresses in responses without a database read.
+    """
+    registry = project_registries.get(net)
+    if registry is None:
+        return None
+    project_id = registry.project_by_address.get(address_key(address))
+    if project_id is None:
+        return None
+    project = registry.projects.get(project_id, {})
+    return {"project_id": project_id, "display_name": project.get("display_name")}
+
+
+def transaction_addresses(tx: CCD_BlockItemSummary) -> list[str]:
+    """
+    The accounts, contracts and modules a transaction involves: its sender,
+    receivers, created account, deployed module, and the contracts it
+    initialized or updated.
+    """
+    addresses = []
+    if tx.account_creation:
+        addresses.append(tx.account_creation.address)
+    if not tx.account_transaction:
+        return addresses
+
+    addresses.append(tx.account_transaction.sender)
+    effects = tx.account_transaction.effects
+    if effects.account_transfer:
+        addresses.append(effects.account_transfer.receiver)
+    if effects.transferred_with_schedule:
+        addresses.append(effects.transferred_with_schedule.receiver)
+    if effects.module_deployed:
+        addresses.append(effects.module_deployed)
+    if effects.contract_initialized:
+        addresses.append(effects.contract_initialized.address.to_str())
+        addresses.append(effects.contract_initialized.origin_ref)
+    if effects.contract_update_issued:
+        for effect in effects.contract_update_issued.effects:
+            if effect.updated:
+                addresses.append(effect.updated.address.to_str())
+            elif effect.interrupted:
+                addresses.append(effect.interrupted.address.to_str())
+            elif effect.transferred:
+                addresses.append(effect.transferred.receiver)
+    return addresses
+
+
+def get_transactions_project_attribution(
+    net: str, txs: list[CCD_BlockItemSummary]
+) -> dict[str, dict]:
+    """
+    Project attribution for every address involved in a list of transactions,
+    keyed on the address as it appears in the transactions. Addresses that
+    don't belong to a project are left out.
+    """
+    attribution = {}
+    for tx in txs:
+        for address in transaction_addresses(tx):
+            if address not in attribution:
+                attribution[address] = get_project_attribution(net, address)
+    return {k: v for k, v in attribution.items() if v is not None}
@@ -0,0 +1,557 @@
+import datetime as dt
+from typing import Awaitable, Callable, NamedTuple
+
+from ccdexplorer_fundamentals.mongodb import Collections, MongoMotor
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from rich import print
+
+from app.api_collections import CollectionsAPI, get_api_db
+from app.routers.v2.contract_v2 import prefetch_instance_metadata
+
+# Rollups only process blocks this far behind the newest data, so a block
+# that is still being written by the ingest services is never counted half.
+ROLLUP_LAG_IN_BLOCKS = 10
+ROLLUP_BATCH_IN_BLOCKS = 10_000
+ROLLUP_LEASE_IN_SECONDS = 5 * 60
+
+
+async def get_rollup_state(motormongo: MongoMotor, net: str, rollup: str) -> dict:
+    """
+    Returns the state for a rollup: the last processed `block_height` (the
+    high-water mark) and whether it has `caught_up` with the source data.
+    """
+    api_db = get_api_db(motormongo, net)
+    state = await api_db[CollectionsAPI.rollup_state.value].find_one({"_id": rollup})
+    return state or {"_id": rollup, "block_height": -1, "caught_up": False}
+
+
+async def rollup_is_caught_up(motormongo: MongoMotor, net: str, rollup: str) -> bool:
+    return (await get_rollup_state(motormongo, net, rollup))["caught_up"]
+
+
+async def claim_block_range(
+    motormongo: MongoMotor, net: str, rollup: str, target_height: int
+) -> tuple[int, int] | None:
+    """
+    Claim the next range of blocks to process for a rollup by taking a lease
+    on its state with a compare-and-set. Only one API process holds the lease,
+    so ranges are processed once and in order. A lease from a process that
+    died expires after `ROLLUP_LEASE_IN_SECONDS`.
+    """
+    api_db = get_api_db(motormongo, net)
+    state = await get_rollup_state(motormongo, net, rollup)
+    start = state["block_height"] + 1
+    if start > target_height:
+        if not state["caught_up"]:
+            await api_db[CollectionsAPI.rollup_state.value].update_one(
+                {"_id": rollup}, {"$set": {"caught_up": True}}
+            )
+        return None
+
+    now = dt.datetime.now().astimezone(dt.timezone.utc)
+    try:
+        result = await api_db[CollectionsAPI.rollup_state.value].update_one(
+            {
+                "_id": rollup,
+                "block_height": state["block_height"],
+                "$or": [
+                    {"leased_until": {"$exists": False}},
+                    {"leased_until": {"$lt": now}},
+                ],
+            },
+            {
+                "$set": {
+                    "leased_until": now + dt.timedelta(seconds=ROLLUP_LEASE_IN_SECONDS)
+                },
+                "$setOnInsert": {"caught_up": False},
+            },
+            upsert=state["block_height"] == -1,
+        )
+    except DuplicateKeyError:
+        return None
+    if result.matched_count == 0 and result.upserted_id is None:
+        return None
+    return start, min(target_height, start + ROLLUP_BATCH_IN_BLOCKS - 1)
+
+
+async def commit_block_range(
+    motormongo: MongoMotor,
+    net: str,
+    rollup: str,
+    block_range: tuple[int, int],
+    target_height: int,
+):
+    """
+    Move the high-water mark past a processed range and release the lease.
+    """
+    api_db = get_api_db(motormongo, net)
+    await api_db[CollectionsAPI.rollup_state.value].update_one(
+        {"_id": rollup, "block_height": block_range[0] - 1},
+        {
+            "$set": {
+                "block_height": block_range[1],
+                "caught_up": block_range[1] == target_height,
+            },
+            "$unset": {"leased_until": ""},
+        },
+    )
+
+
+async def release_block_range(
+    motormongo: MongoMotor, net: str, rollup: str, block_range: tuple[int, int]
+):
+    """
+    Release the lease after a failure, so the range is processed again.
+    """
+    api_db = get_api_db(motormongo, net)
+    await api_db[CollectionsAPI.rollup_state.value].update_one(
+        {"_id": rollup, "block_height": block_range[0] - 1},
+        {"$unset": {"leased_until": ""}},
+    )
+
+
+class Rollup(NamedTuple):
+    # the API collection that is maintained, also the name of its state.
+    name: str
+    # the collection it is computed from, and its block height field.
+    source: Collections
+    height_field: str
+    # called as `func(motormongo, net, start, end)` for a claimed range.
+    func: Callable[[MongoMotor, str, int, int], Awaitable[None]]
+
+
+async def get_rollup_target_height(db_to_use, rollup: Rollup) -> int:
+    result = await db_to_use[rollup.source].find_one(
+        {}, {rollup.height_field: 1}, sort=[(rollup.height_field, -1)]
+    )
+    if not result:
+        return -1
+    height = result
+    for key in rollup.height_field.split("."):
+        height = height[key]
+    return height - ROLLUP_LAG_IN_BLOCKS
+
+
+async def process_rollup(motormongo: MongoMotor, net: str, rollup: Rollup):
+    """
+    Process claimed block ranges until the rollup has caught up with its source.
+    """
+    db_to_use = motormongo.testnet if net == "testnet" else motormongo.mainnet
+    target_height = await get_rollup_target_height(db_to_use, rollup)
+    while block_range := await claim_block_range(
+        motormongo, net, rollup.name, target_height
+    ):
+        try:
+            await rollup.func(motormongo, net, *block_range)
+        except Exception as error:
+            await release_block_range(motormongo, net, rollup.name, block_range)
+            print(f"Rollup {rollup.name} on {net} failed for {block_range}: {error}")
+            return
+        await commit_block_range(
+            motormongo, net, rollup.name, block_range, target_height
+        )
+
+
+async def update_module_usage_per_day(
+    motormongo: MongoMotor, net: str, start: int, end: int
+):
+    """
+    Count impacted addresses per (module ref, date) for contract instances,
+    for the days touched by blocks `start` up to and including `end`. Those
+    days are counted again from the source for all their blocks up to `end`
+    and the counts are set, not incremented, so processing a range again
+    (after a failure) writes the same counts.
+    """
+    db_to_use = motormongo.testnet if net == "testnet" else motormongo.mainnet
+    dates = await db_to_use[Collections.impacted_addresses].distinct(
+        "date",
+        {
+            "block_height": {"$gte": start, "$lte": end},
+            "impacted_address_canonical": {"$regex": "^<"},
+        },
+    )
+    if not dates:
+        return
+
+    pipeline = [
+        {
+            "$match": {
+                "date": {"$in": dates},
+                "block_height": {"$lte": end},
+                "impacted_address_canonical": {"$regex": "^<"},
+            }
+        },
+        {
+            "$group": {
+                "_id": {"address": "$impacted_address_canonical", "date": "$date"},
+                "count": {"$sum": 1},
+            }
+        },
+    ]
+    result = (
+        await db_to_use[Collections.impacted_addresses]
+        .aggregate(pipeline)
+        .to_list(length=None)
+    )
+    instances = await prefetch_instance_metadata(
+        db_to_use, list({x["_id"]["address"] for x in result})
+    )
+    counts = module_usage_counts(result, instances)
+
+    if counts:
+        api_db = get_api_db(motormongo, net)
+        await api_db[CollectionsAPI.module_usage_per_day.value].bulk_write(
+            [
+                UpdateOne(
+                    {"_id": f"{module_ref}-{date}"},
+                    {
+                        "$set": {
+                            "module_ref": module_ref,
+                            "date": date,
+                            "count": count,
+                        }
+                    },
+                    upsert=True,
+                )
+                for (module_ref, date), count in counts.items()
+            ],
+            ordered=False,
+        )
+
+
+def module_usage_counts(
+    result: list[dict], instances: dict
+) -> dict[tuple[str, str], int]:
+    """
+    Fold counts per (instance address, date) into counts per (module ref, date).
+    """
+    counts: dict[tuple[str, str], int] = {}
+    for x in result:
+        metadata = instances.get(x["_id"]["address"])
+        if not metadata:
+            continue
+        key = (metadata.source_module, x["_id"]["date"])
+        counts[key] = counts.get(key, 0) + x["count"]
+    return counts
+
+
+REWARD_TYPES = ["baker_reward", "finalization_reward", "transaction_fee_reward"]
+# rewards from before paydays are only known as a total per account, kept in
+# `impacted_addresses_pre_payday`. They are the opening row for an account,
+# with a date that sorts before all real dates.
+PRE_PAYDAY_DATE = "0000-00-00"
+
+
+async def update_account_rewards_per_day(
+    motormongo: MongoMotor, net: str, start: int, end: int
+):
+    """
+    Rebuild the per-account, per-day rewards rows for the accounts and days
+    touched by blocks `start` up to and including `end`. Every row also holds
+    the running totals (`cum_*`) up to and including its date.
+
+    The touched days are summed again from the source for all their blocks up
+    to `end`, and running totals continue from the last row dated before the
+    first touched day, which this range never writes. Processing a range again
+    (after a failure) therefore overwrites rows with the same values.
+    """
+    db_to_use = motormongo.testnet if net == "testnet" else motormongo.mainnet
+    touched = (
+        await db_to_use[Collections.impacted_addresses]
+        .aggregate(
+            [
+                {
+                    "$match": {
+                        "block_height": {"$gte": start, "$lte": end},
+                        "effect_type": "Account Reward",
+                    }
+                },
+                {
+                    "$group": {
+                        "_id": "$impacted_address_canonical",
+                        "first_date": {"$min": "$date"},
+                    }
+                },
+            ]
+        )
+        .to_list(length=None)
+    )
+    if not touched:
+        return
+
+    accounts = [x["_id"] for x in touched]
+    first_date = min(x["first_date"] for x in touched)
+    pipeline = [
+        {
+            "$match": {
+                "impacted_address_canonical": {"$in": accounts},
+                "effect_type": "Account Reward",
+                "date": {"$gte": first_date},
+                "block_height": {"$lte": end},
+            }
+        },
+        {
+            "$group": {
+                "_id": {"account": "$impacted_address_canonical", "date": "$date"},
+                **{
+                    reward_type: {"$sum": f"$balance_movement.{reward_type}"}
+                    for reward_type in REWARD_TYPES
+                },
+            }
+        },
+        {"$sort": {"_id.date": 1}},
+    ]
+    day_totals = (
+        await db_to_use[Collections.impacted_addresses]
+        .aggregate(pipeline)
+        .to_list(length=None)
+    )
+
+    api_db = get_api_db(motormongo, net)
+    collection = api_db[CollectionsAPI.account_rewards_per_day.value]
+    previous_rows = {
+        x["_id"]: x["row"]
+        for x in await collection.aggregate(
+            [
+                {"$match": {"account": {"$in": accounts}, "date": {"$lt": first_date}}},
+                {"$sort": {"account": 1, "date": -1}},
+                {"$group": {"_id": "$account", "row": {"$first": "$$ROOT"}}},
+            ]
+        ).to_list(length=None)
+    }
+
+    # accounts without earlier rows get their opening row now.
+    opening_rows = []
+    new_accounts = [x for x in accounts if x not in previous_rows]
+    if new_accounts:
+        for x in (
+            await db_to_use[Collections.impacted_addresses_pre_payday]
+            .find({"impacted_address_canonical": {"$in": new_accounts}})
+            .to_list(length=None)
+        ):
+            account = x["impacted_address_canonical"]
+            totals = {t: x.get(f"sum_{t}", 0) for t in REWARD_TYPES}
+            row = account_rewards_row(account, PRE_PAYDAY_DATE, totals, totals)
+            previous_rows[account] = row
+            opening_rows.append(row)
+
+    rows = opening_rows + account_rewards_rows(day_totals, previous_rows)
+    await collection.bulk_write(
+        [ReplaceOne({"_id": row["_id"]}, row, upsert=True) for row in rows],
+        ordered=False,
+    )
+
+
+def account_rewards_rows(
+    day_totals: list[dict], previous_rows: dict[str, dict]
+) -> list[dict]:
+    """
+    Rows for rewards per (account, date), sorted on date, with running totals
+    that continue from the previous row of each account (if any).
+    """
+    cum = {
+        account: {t: row[f"cum_{t}"] for t in REWARD_TYPES}
+        for account, row in previous_rows.items()
+    }
+    rows = []
+    for x in day_totals:
+        account, date = x["_id"]["account"], x["_id"]["date"]
+        running = cum.setdefault(account, {t: 0 for t in REWARD_TYPES})
+        for t in REWARD_TYPES:
+            running[t] += x[t]
+        rows.append(
+            account_rewards_row(
+                account, date, {t: x[t] for t in REWARD_TYPES}, dict(running)
+            )
+        )
+    return rows
+
+
+def account_rewards_row(account: str, date: str, day: dict, cum: dict) -> dict:
+    return {
+        "_id": f"{account}-{date}",
+        "account": account,
+        "date": date,
+        **day,
+        **{f"cum_{t}": cum[t] for t in REWARD_TYPES},
+    }
+
+
+async def update_account_creations(
+    motormongo: MongoMotor, net: str, start: int, end: int
+):
+    """
+    Map accounts created in blocks `start` up to and including `end` to the
+    hash of their account creation transaction.
+    """
+    db_to_use = motormongo.testnet if net == "testnet" else motormongo.mainnet
+    result = (
+        await db_to_use[Collections.transactions]
+        .find(
+            {
+                "block_info.height": {"$gte": start, "$lte": end},
+                "account_creation": {"$exists": True},
+            },
+            {"account_creation.address": 1, "block_info.height": 1},
+        )
+        .to_list(length=None)
+    )
+    if not result:
+        return
+
+    api_db = get_api_db(motormongo, net)
+    await api_db[CollectionsAPI.account_creations.value].bulk_write(
+        [
+            ReplaceOne(
+                {"_id": x["account_creation"]["address"]},
+                {"tx_hash": x["_id"], "block_height": x["block_info"]["height"]},
+                upsert=True,
+            )
+            for x in result
+        ],
+        ordered=False,
+    )
+
+
+async def update_account_aliases(
+    motormongo: MongoMotor, net: str, start: int, end: int
+):
+    """
+    Add the addresses (aliases) that appear in blocks `start` up to and
+    including `end` to the alias set of their canonical account address.
+    """
+    db_to_use = motormongo.testnet if net == "testnet" else motormongo.mainnet
+    pipeline = [
+        {
+            "$match": {
+                "block_height": {"$gte": start, "$lte": end},
+                "effect_type": {"$ne": "data_registered"},
+                "impacted_address_canonical": {"$not": {"$regex": "^<"}},
+            }
+        },
+        {
+            "$group": {
+                "_id": "$impacted_address_canonical",
+                "aliases": {"$addToSet": "$impacted_address"},
+            }
+        },
+    ]
+    result = (
+        await db_to_use[Collections.impacted_addresses]
+        .aggregate(pipeline)
+        .to_list(length=None)
+    )
+    if not result:
+        return
+
+    api_db = get_api_db(motormongo, net)
+    await api_db[CollectionsAPI.account_aliases.value].bulk_write(
+        [
+            UpdateOne(
+                {"_id": x["_id"]},
+                {"$addToSet": {"aliases": {"$each": x["aliases"]}}},
+                upsert=True,
+            )
+            for x in result
+        ],
+        ordered=False,
+    )
+
+
+async def update_account_token_contracts(
+    motormongo: MongoMotor, net: str, start: int, end: int
+):
+    """
+    Add the CIS-2 contracts that logged token events for an account in blocks
+    `start` up to and including `end` to the contract set of that account.
+    """
+    db_to_use = motormongo.testnet if net == "testnet" else motormongo.mainnet
+    pipeline = [
+        {
+            "$match": {
+                "block_height": {"$gte": start, "$lte": end},
+                "effect_type": {"$ne": "data_registered"},
+                "contract": {"$exists": True},
+                "event_type": {"$exists": True},
+            }
+        },
+        {
+            "$group": {
+                "_id": "$impacted_address_canonical",
+                "contracts": {"$addToSet": "$contract"},
+            }
+        },
+    ]
+    result = (
+        await db_to_use[Collections.impacted_addresses]
+        .aggregate(pipeline)
+        .to_list(length=None)
+    )
+    if not result:
+        return
+
+    api_db = get_api_db(motormongo, net)
+    await api_db[CollectionsAPI.account_token_contracts.value].bulk_write(
+        [
+            UpdateOne(
+                {"_id": x["_id"]},
+                {"$addToSet": {"contracts": {"$each": x["contracts"]}}},
+                upsert=True,
+            )
+            for x in result
+        ],
+        ordered=False,
+    )
+
+
+ROLLUPS = [
+    Rollup(
+        CollectionsAPI.module_usage_per_day.value,
+        Collections.impacted_addresses,
+        "block_height",
+        update_module_usage_per_day,
+    ),
+    Rollup(
+        CollectionsAPI.account_rewards_per_day.value,
+        Collections.impacted_addresses,
+        "block_height",
+        update_account_rewards_per_day,
+    ),
+    Rollup(
+        CollectionsAPI.account_creations.value,
+        Collections.transactions,
+        "block_info.height",
+        update_account_creations,
+    ),
+    Rollup(
+        CollectionsAPI.account_aliases.value,
+        Collections.impacted_addresses,
+        "block_height",
+        update_account_aliases,
+    ),
+    Rollup(
+        CollectionsAPI.account_token_contracts.value,
+        Collections.impacted_addresses,
+        "block_height",
+        update_account_token_contracts,
+    ),
+]
+
+
+# indexes the rollups need for their own lookups, created on first run.
+ROLLUP_INDEXES = {
+    CollectionsAPI.account_rewards_per_day.value: [("account", 1), ("date", -1)],
+}
+indexes_created: set[str] = set()
+
+
+async def run_rollups(motormongo: MongoMotor):
+    for net in ["mainnet", "testnet"]:
+        if net not in indexes_created:
+            api_db = get_api_db(motormongo, net)
+            for collection, index in ROLLUP_INDEXES.items():
+                await api_db[collection].create_index(index)
+            indexes_created.add(net)
+        for rollup in ROLLUPS:
+            await process_rollup(motormongo, net, rollup)
@@ -1,3 +1,4 @@
+import asyncio
 import grpc
 from pymongo.collection import Collection
 from ccdexplorer_fundamentals.enums import NET
@@ -35,22 +36,49 @@ from app.routers.v2.contract_v2 import (
     get_balance_of,
     GetBalanceOfRequest,
     get_module_name_from_contract_address,
+    prefetch_instance_metadata,
 )
-from app.utils import TokenHolding
+from app.api_collections import CollectionsAPI, get_api_db
+from app.apy import get_apy_lookup, get_apy_object, lookup_apy
+from app.cache import LRUCache
+from app.paydays import get_current_payday_key
+from app.projects import (
+    get_project_attribution,
+    get_transactions_project_attribution,
+)
+from app.rollups import PRE_PAYDAY_DATE, REWARD_TYPES, get_rollup_state
+from app.utils import FlowEdge, FlowGraph, TokenHolding
 
 
 router = APIRouter(tags=["Account"], prefix="/v2")
 
 
+# fungible token tags rarely change, so they are kept in memory per net.
+fungible_token_tags_cache = LRUCache(maxsize=2, ttl=5 * 60)
+
+
+async def get_fungible_token_tags(db_to_use) -> dict[str, dict]:
+    """
+    The tags for fungible tokens, keyed on their contract.
+    """
+
+    async def load():
+        return {
+            x["contracts"][0]: x
+            for x in await db_to_use[Collections.tokens_tags]
+            .find({"token_type": "fungible"})
+            .to_list(length=None)
+        }
+
+    return await fungible_token_tags_cache.get_or_load(
+        db_to_use[Collections.tokens_tags].full_name, load
+    )
+
+
 async def convert_account_fungible_tokens_value_to_USD(
     tokens_dict: dict[str, TokenHolding], db_to_use: Collection, exchange_rates
 ):
-    tokens_tags = {
-        x["contracts"][0]: x
-        for x in await db_to_use[Collections.tokens_tags]
-        .find({"token_type": "fungible"})
-        .to_list(length=None)
-    }
+    tokens_tags = await get_fungible_token_tags(db_to_use)
 
     tokens_with_metadata: dict[str, TokenHolding] = {}
     for contract, d in tokens_dict.items():
@@ -175,12 +203,7 @@ async def get_account_fungible_tokens_value_in_USD(
     db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
 
     # first get all contracts for fungible tokens
-    fungible_contracts = {
-        x["contracts"][0]: x
-        for x in await db_to_use[Collections.tokens_tags]
-        .find({"token_type": "fungible"}, {"_id": 1, "contracts": 1})
-        .to_list(length=None)
-    }
+    fungible_contracts = await get_fungible_token_tags(db_to_use)
     pipeline = [
         {
             "$match": {
@@ -196,6 +219,7 @@ async def get_account_fungible_tokens_value_in_USD(
     )
 
     tokens = [TokenHolding(**x["token_holding"]) for x in result_list]
+    await prefetch_instance_metadata(db_to_use, [x.contract for x in tokens])
 
     # use grpc balance_of method
     for token in tokens:
@@ -260,12 +284,7 @@ async def get_account_token_symbols_for_flow(
     db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
 
     # first get all contracts for fungible tokens
-    fungible_contracts = {
-        x["contracts"][0]: x
-        for x in await db_to_use[Collections.tokens_tags]
-        .find({"token_type": "fungible"}, {"_id": 1, "contracts": 1})
-        .to_list(length=None)
-    }
+    fungible_contracts = await get_fungible_token_tags(db_to_use)
 
     pipeline = [
         {"$match": {"effect_type": {"$ne": "data_registered"}}},
@@ -289,7 +308,24 @@ async def get_account_token_symbols_for_flow(
             }
         },
     ]
-    contracts = (
+    contracts = []
+    state = await get_rollup_state(
+        mongomotor, net, CollectionsAPI.account_token_contracts.value
+    )
+    if state["caught_up"]:
+        result = await get_api_db(mongomotor, net)[
+            CollectionsAPI.account_token_contracts.value
+        ].find_one({"_id": account_address[:29]})
+        contracts = [
+            {"contract": x}
+            for x in (result["contracts"] if result else [])
+            if x in fungible_contracts
+        ]
+        # the contract sets lag behind, so only token events after their
+        # high-water mark are searched for in impacted addresses.
+        pipeline.insert(0, {"$match": {"block_height": {"$gt": state["block_height"]}}})
+
+    contracts += (
         await db_to_use[Collections.impacted_addresses]
         .aggregate(pipeline)
         .to_list(length=None)
@@ -395,6 +431,7 @@ async def get_account_fungible_tokens_verified(
     else:
         total_token_count = 0
     tokens = [TokenHolding(**x["token_holding"]) for x in all_tokens]
+    await prefetch_instance_metadata(db_to_use, [x.contract for x in tokens])
 
     # add verified information and metadata and USD value
     for index, token in enumerate(tokens):
@@ -527,6 +564,7 @@ async def get_account_non_fungible_tokens_verified(
     else:
         total_token_count = 0
     tokens = [TokenHolding(**x["token_holding"]) for x in all_tokens]
+    await prefetch_instance_metadata(db_to_use, [x.contract for x in tokens])
 
     # add verified information and metadata
     for token in tokens:
@@ -641,6 +679,7 @@ async def get_account_tokens_unverified(
     else:
         total_token_count = 0
     tokens = [TokenHolding(**x["token_holding"]) for x in all_tokens]
+    await prefetch_instance_metadata(db_to_use, [x.contract for x in tokens])
 
     # add metadata
     for token in tokens:
@@ -674,6 +713,57 @@ async def get_account_tokens_unverified(
         )
 
 
+BALANCE_AT_BLOCK_NODE_CONCURRENCY = 10
+
+
+def balance_at_block_redis_key(net: str, account_address: str) -> str:
+    # aliases share their balance, so the canonical address is used.
+    return f"api:balance-at-block:{net}:{account_address[:29]}"
+
+
+async def get_account_balances_at_blocks(
+    redis, grpcclient: GRPCClient, net: str, account_address: str, blocks: list[int]
+) -> dict[int, int | None]:
+    """
+    CCD balance in microCCD for an account at a list of block heights. The balance
+    at a finalized block never changes, so balances are kept in Redis, in one hash
+    per account with the block height as field. Misses are asked from the node
+    concurrently. Blocks where the account or block is not found map to `None`.
+    """
+    blocks = list(dict.fromkeys(blocks))
+    key = balance_at_block_redis_key(net, account_address)
+    cached = await redis.hmget(key, blocks) if blocks else []
+    balances = {
+        block: int(value) for block, value in zip(blocks, cached) if value is not None
+    }
+
+    semaphore = asyncio.Semaphore(BALANCE_AT_BLOCK_NODE_CONCURRENCY)
+
+    async def get_balance(block: int) -> int | None:
+        async with semaphore:
+            try:
+                result = await asyncio.to_thread(
+                    grpcclient.get_account_info, block, account_address, net=NET(net)
+                )
+            except grpc._channel._InactiveRpcError:
+                result = None
+        return result.amount if result else None
+
+    misses = [block for block in blocks if block not in balances]
+    if misses:
+        fetched = dict(
+            zip(misses, await asyncio.gather(*[get_balance(x) for x in misses]))
+        )
+        found = {
+            block: amount for block, amount in fetched.items() if amount is not None
+        }
+        if found:
+            await redis.hset(key, mapping=found)
+        balances.update(fetched)
+
+    return {block: balances.get(block) for block in blocks}
+
+
 @router.get(
     "/{net}/account/{account_address}/balance/block/{block}",
     response_class=JSONResponse,
@@ -697,13 +787,13 @@ async def get_account_balance_at_block(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    try:
-        result = grpcclient.get_account_info(block, account_address, net=NET(net))
-    except grpc._channel._InactiveRpcError:
-        result = None
+    balances = await get_account_balances_at_blocks(
+        request.app.redis, grpcclient, net, account_address, [block]
+    )
+    result = balances[block]
 
-    if result:
-        return result.amount
+    if result is not None:
+        return result
     else:
         raise HTTPException(
             status_code=404,
@@ -711,6 +801,41 @@ async def get_account_balance_at_block(
         )
 
 
+@router.post(
+    "/{net}/account/{account_address}/balance/blocks",
+    response_class=JSONResponse,
+)
+async def get_account_balance_at_blocks(
+    request: Request,
+    net: str,
+    account_address: str,
+    blocks: list[int],
+    grpcclient: GRPCClient = Depends(get_grpcclient),
+    api_key: str = Security(API_KEY_HEADER),
+) -> dict[int, int | None]:
+    """
+    Endpoint to get all CCD balance in microCCD for a given account at each of the given blocks.
+    Blocks where the account or the block is not found map to `null`.
+
+
+    """
+    if net not in ["mainnet", "testnet"]:
+        raise HTTPException(
+            status_code=404,
+            detail="Don't be silly. We only support mainnet and testnet.",
+        )
+
+    if len(blocks) > 1000:
+        raise HTTPException(
+            status_code=400,
+            detail="Number of blocks must be less than or equal to 1000.",
+        )
+
+    return await get_account_balances_at_blocks(
+        request.app.redis, grpcclient, net, account_address, blocks
+    )
+
+
 @router.get("/{net}/account/{account_address}/balance/USD", response_class=JSONResponse)
 async def get_account_balance_in_USD(
     request: Request,
@@ -977,6 +1102,77 @@ async def get_validator_pool_info(
         )
 
 
+BUCKETS = ["day", "week", "month"]
+
+
+def validate_bucket_and_dates(
+    bucket: str | None, start_date: str | None, end_date: str | None
+) -> dict:
+    """
+    Returns the `date` filter for the optional date range.
+    """
+    if bucket and bucket not in BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Bucket must be one of {', '.join(BUCKETS)}.",
+        )
+
+    date_filter = {}
+    try:
+        if start_date:
+            date_filter["$gte"] = f"{dateutil.parser.parse(start_date):%Y-%m-%d}"
+        if end_date:
+            date_filter["$lte"] = f"{dateutil.parser.parse(end_date):%Y-%m-%d}"
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Start and end date must be dates (YYYY-MM-DD).",
+        )
+    return date_filter
+
+
+async def get_bucketed_series(
+    collection,
+    match: dict,
+    bucket: str,
+    sums: dict[str, str],
+    averages: dict[str, str] | None = None,
+) -> dict[str, str | list]:
+    """
+    Aggregates daily documents into day, week (starting Monday) or month buckets and
+    returns them columnar: a list of bucket start dates in `timestamps` and one list
+    per metric, with `sums` summed and `averages` averaged over the bucket.
+    """
+    averages = averages or {}
+    pipeline = [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": {
+                    "$dateToString": {
+                        "format": "%Y-%m-%d",
+                        "date": {
+                            "$dateTrunc": {
+                                "date": {"$dateFromString": {"dateString": "$date"}},
+                                "unit": bucket,
+                                "startOfWeek": "monday",
+                            }
+                        },
+                    }
+                },
+                **{name: {"$sum": expression} for name, expression in sums.items()},
+                **{name: {"$avg": expression} for name, expression in averages.items()},
+            }
+        },
+        {"$sort": {"_id": 1}},
+    ]
+    result = await collection.aggregate(pipeline).to_list(length=None)
+    series = {"bucket": bucket, "timestamps": [x["_id"] for x in result]}
+    for name in [*sums.keys(), *averages.keys()]:
+        series[name] = [x[name] for x in result]
+    return series
+
+
 @router.get(
     "/{net}/account/{account_id}/staking-rewards-bucketed", response_class=JSONResponse
 )
@@ -984,12 +1180,16 @@ async def get_staking_rewards_bucketed(
     request: Request,
     net: str,
     account_id: int | str,
+    bucket: str | None = None,
+    start_date: str | None = None,
+    end_date: str | None = None,
     mongomotor: MongoMotor = Depends(get_mongo_motor),
     api_key: str = Security(API_KEY_HEADER),
-) -> list:
+) -> list | dict:
     """
     Endpoint to get staking rewards info for a given account for graphing.
-
+    With `bucket` (day, week or month), rewards are summed per bucket and returned columnar,
+    with the average staked amount. `start_date` and `end_date` optionally limit the range.
 
     """
     if net not in ["mainnet", "testnet"]:
@@ -998,11 +1198,29 @@ async def get_staking_rewards_bucketed(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
+    date_filter = validate_bucket_and_dates(bucket, start_date, end_date)
+    match = {"account_id": account_id}
+    if date_filter:
+        match["date"] = date_filter
+
     db_to_use = mongomotor.mainnet
-    pp = [
-        {"$match": {"account_id": account_id}},
-    ]
     try:
+        if bucket:
+            return await get_bucketed_series(
+                db_to_use[Collections.paydays_rewards],
+                match,
+                bucket,
+                sums={
+                    "baker_reward": "$reward.baker_reward",
+                    "finalization_reward": "$reward.finalization_reward",
+                    "transaction_fees": "$reward.transaction_fees",
+                },
+                averages={"staked_amount": "$staked_amount"},
+            )
+
+        pp = [
+            {"$match": match},
+        ]
         result_pp = (
             await db_to_use[Collections.paydays_rewards]
             .aggregate(pp)
@@ -1021,12 +1239,17 @@ async def get_validator_performance(
     request: Request,
     net: str,
     index: str,
+    bucket: str | None = None,
+    start_date: str | None = None,
+    end_date: str | None = None,
     mongomotor: MongoMotor = Depends(get_mongo_motor),
     api_key: str = Security(API_KEY_HEADER),
-) -> list:
+) -> list | dict:
     """
     Endpoint to get validator performance for a given validator.
-
+    With `bucket` (day, week or month), blocks, expectation and fees are summed per bucket
+    and returned columnar, with the average effective stake and lottery power.
+    `start_date` and `end_date` optionally limit the range.
 
     """
     if net not in ["mainnet", "testnet"]:
@@ -1035,11 +1258,32 @@ async def get_validator_performance(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
+    date_filter = validate_bucket_and_dates(bucket, start_date, end_date)
+    match = {"baker_id": index}
+    if date_filter:
+        match["date"] = date_filter
+
     db_to_use = mongomotor.mainnet
     try:
+        if bucket:
+            return await get_bucketed_series(
+                db_to_use[Collections.paydays_performance],
+                match,
+                bucket,
+                sums={
+                    "blocks_baked": "$pool_status.current_payday_info.blocks_baked",
+                    "expectation": "$expectation",
+                    "transaction_fees_earned": "$pool_status.current_payday_info.transaction_fees_earned",
+                },
+                averages={
+                    "effective_stake": "$pool_status.current_payday_info.effective_stake",
+                    "lottery_power": "$pool_status.current_payday_info.lottery_power",
+                },
+            )
+
         result = (
             await db_to_use[Collections.paydays_performance]
-            .find({"baker_id": index})
+            .find(match)
             .sort("date", ASCENDING)
             .to_list(length=None)
         )
@@ -1179,6 +1423,65 @@ async def get_validator_tally(
         )
 
 
+# the delegators for the reward period only change at a payday, so they are
+# cached per payday, sorted by stake. Delegators in the last finalized block
+# change with every block, so they are only cached briefly.
+pool_delegators_payday_cache = LRUCache(maxsize=2_000)
+pool_delegators_in_block_cache = LRUCache(maxsize=2_000, ttl=10)
+
+
+async def get_pool_delegators_current_payday(
+    grpcclient: GRPCClient, net: str, index: int
+) -> list | None:
+    """
+    Delegators to the pool of the validator with account index `index` for the current
+    reward period, sorted by stake. Returns `None` if the account is not a validator.
+    """
+    payday = await get_current_payday_key(grpcclient, net)
+
+    async def load():
+        account_info = grpcclient.get_account_info(
+            block_hash="last_final", account_index=index, net=NET(net)
+        )
+        validator = account_info.stake.baker
+        if not validator:
+            return None
+        try:
+            delegators_current_payday = [
+                x
+                for x in grpcclient.get_delegators_for_pool_in_reward_period(
+                    pool_id=validator.baker_info.baker_id,
+                    block_hash="last_final",
+                    net=NET(net),
+                )
+            ]
+        except:  # noqa: E722
+            delegators_current_payday = []
+        return sorted(delegators_current_payday, key=lambda x: x.stake, reverse=True)
+
+    return await pool_delegators_payday_cache.get_or_load((net, index, payday), load)
+
+
+async def get_pool_delegators_in_block(
+    grpcclient: GRPCClient, net: str, index: int
+) -> list:
+    # a validator id is the account index of the validator.
+    async def load():
+        try:
+            return [
+                x
+                for x in grpcclient.get_delegators_for_pool(
+                    pool_id=index,
+                    block_hash="last_final",
+                    net=NET(net),
+                )
+            ]
+        except:  # noqa: E722
+            return []
+
+    return await pool_delegators_in_block_cache.get_or_load((net, index), load)
+
+
 @router.get(
     "/{net}/account/{index}/pool/delegators/{skip}/{limit}", response_class=JSONResponse
 )
@@ -1188,12 +1491,14 @@ async def get_account_pool_delegators(
     index: int,
     skip: int,
     limit: int,
+    include_full_lists: bool = False,
     grpcclient: GRPCClient = Depends(get_grpcclient),
     api_key: str = Security(API_KEY_HEADER),
-) -> dict:
+) -> dict | None:
     """
     Endpoint to get all delegators to pool.
-
+    The complete `delegators_in_block` and `delegators_current_payday` lists are
+    only included with `include_full_lists`.
 
     """
     if net not in ["mainnet", "testnet"]:
@@ -1215,52 +1520,24 @@ async def get_account_pool_delegators(
         )
 
     try:
-        account_info = grpcclient.get_account_info(
-            block_hash="last_final", account_index=index, net=NET(net)
-        )
-        validator = account_info.stake.baker
-        if validator:
-            try:
-                delegators_current_payday = [
-                    x
-                    for x in grpcclient.get_delegators_for_pool_in_reward_period(
-                        pool_id=validator.baker_info.baker_id,
-                        block_hash="last_final",
-                        net=NET(net),
-                    )
-                ]
-            except:  # noqa: E722
-                delegators_current_payday = []
-
-            try:
-                delegators_in_block = [
-                    x
-                    for x in grpcclient.get_delegators_for_pool(
-                        pool_id=validator.baker_info.baker_id,
-                        block_hash="last_final",
-                        net=NET(net),
-                    )
-                ]
-            except:  # noqa: E722
-                delegators_in_block = []
-
-            delegators_current_payday_list = set(
-                [x.account for x in delegators_current_payday]
-            )
-            delegators_in_block_list = set([x.account for x in delegators_in_block])
-
-            new_delegators = delegators_in_block_list - delegators_current_payday_list
-
-            delegators = sorted(
-                delegators_current_payday, key=lambda x: x.stake, reverse=True
-            )
-            return {
-                "delegators": delegators[skip : (skip + limit)],
-                "delegators_in_block": delegators_in_block,
-                "delegators_current_payday": delegators_current_payday,
-                "new_delegators": new_delegators,
-                "total_delegators": len(delegators_current_payday),
-            }
+        delegators = await get_pool_delegators_current_payday(grpcclient, net, index)
+        if delegators is None:
+            return None
+
+        delegators_in_block = await get_pool_delegators_in_block(grpcclient, net, index)
+        new_delegators = set([x.account for x in delegators_in_block]) - set(
+            [x.account for x in delegators]
+        )
+
+        result = {
+            "delegators": delegators[skip : (skip + limit)],
+            "new_delegators": new_delegators,
+            "total_delegators": len(delegators),
+        }
+        if include_full_lists:
+            result["delegators_in_block"] = delegators_in_block
+            result["delegators_current_payday"] = delegators
+        return result
     except Exception as error:
         raise HTTPException(
             status_code=404,
@@ -1274,6 +1551,7 @@ async def get_account_apy_data(
     net: str,
     index_or_hash: str,
     mongomotor: MongoMotor = Depends(get_mongo_motor),
+    grpcclient: GRPCClient = Depends(get_grpcclient),
     api_key: str = Security(API_KEY_HEADER),
 ) -> dict:
     """
@@ -1287,11 +1565,8 @@ async def get_account_apy_data(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    db_to_use = mongomotor.mainnet
     try:
-        result = await db_to_use[Collections.paydays_apy_intermediate].find_one(
-            {"_id": {"$eq": str(index_or_hash)}}
-        )
+        result = await get_apy_object(mongomotor, grpcclient, str(index_or_hash))
         return result
     except Exception as error:
         raise HTTPException(
@@ -1342,6 +1617,7 @@ async def get_staking_rewards_object(
     net: str,
     index_or_hash: int | str,
     mongomotor: MongoMotor = Depends(get_mongo_motor),
+    grpcclient: GRPCClient = Depends(get_grpcclient),
     api_key: str = Security(API_KEY_HEADER),
 ) -> dict:
     """
@@ -1355,33 +1631,8 @@ async def get_staking_rewards_object(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
-    raw_apy_object = await db_to_use[Collections.paydays_apy_intermediate].find_one(
-        {"_id": index_or_hash}
-    )
-
-    lookup_apy_object = {
-        "d30": {"sum_of_rewards": 0, "apy": 0},
-        "d90": {"sum_of_rewards": 0, "apy": 0},
-        "d180": {"sum_of_rewards": 0, "apy": 0},
-    }
-    if raw_apy_object:
-        if "d30_apy_dict" in raw_apy_object:
-            if raw_apy_object["d30_apy_dict"] is not None:
-                d30_day = list(raw_apy_object["d30_apy_dict"].keys())[-1]
-                lookup_apy_object["d30"] = raw_apy_object["d30_apy_dict"][d30_day]
-
-        if "d90_apy_dict" in raw_apy_object:
-            if raw_apy_object["d90_apy_dict"] is not None:
-                d90_day = list(raw_apy_object["d90_apy_dict"].keys())[-1]
-                lookup_apy_object["d90"] = raw_apy_object["d90_apy_dict"][d90_day]
-
-        if "d180_apy_dict" in raw_apy_object:
-            if raw_apy_object["d180_apy_dict"] is not None:
-                d180_day = list(raw_apy_object["d180_apy_dict"].keys())[-1]
-                lookup_apy_object["d180"] = raw_apy_object["d180_apy_dict"][d180_day]
-
-    return lookup_apy_object
+    apy_lookup = await get_apy_lookup(mongomotor, grpcclient, net)
+    return lookup_apy(apy_lookup, index_or_hash)
 
 
 @router.get(
@@ -1488,7 +1739,11 @@ async def get_account_txs(
             .to_list(limit)
         )
         tx_result = [CCD_BlockItemSummary(**x) for x in int_result]
-        return {"transactions": tx_result, "total_tx_count": total_tx_count}
+        return {
+            "transactions": tx_result,
+            "total_tx_count": total_tx_count,
+            "projects": get_transactions_project_attribution(net, tx_result),
+        }
     except Exception as error:
         raise HTTPException(
             status_code=404,
@@ -1582,7 +1837,11 @@ async def get_account_validator_txs(
             .to_list(limit)
         )
         tx_result = [CCD_BlockItemSummary(**x) for x in int_result]
-        return {"transactions": tx_result, "total_tx_count": total_tx_count}
+        return {
+            "transactions": tx_result,
+            "total_tx_count": total_tx_count,
+            "projects": get_transactions_project_attribution(net, tx_result),
+        }
     except Exception as error:
         raise HTTPException(
             status_code=404,
@@ -1733,6 +1992,379 @@ async def get_account_token_transactions_for_flow_graph(
         )
 
 
+def get_block_range_for_flow(
+    blocks_per_day: dict[str, MongoTypeBlockPerDay], start_date: str, end_date: str
+) -> tuple[int, int]:
+    amended_start_date = (
+        f"{(dateutil.parser.parse(start_date)-dt.timedelta(days=1)):%Y-%m-%d}"
+    )
+    start_block = blocks_per_day.get(amended_start_date)
+    if start_block:
+        start_block = start_block.height_for_first_block
+    else:
+        start_block = 0
+
+    end_block = blocks_per_day.get(end_date)
+    if end_block:
+        end_block = end_block.height_for_last_block
+    else:
+        end_block = 1_000_000_000
+    return start_block, end_block
+
+
+def parse_flow_threshold(gte: str) -> int:
+    try:
+        return int(gte.replace(",", "").replace(".", ""))
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Threshold {gte} is not a whole number.",
+        )
+
+
+def fold_flow_edges(
+    totals: dict[str, list[int]], gte: int, max_edges: int
+) -> list[FlowEdge]:
+    """
+    Turn `{counterparty: [amount, count]}` into edges, largest first. Counterparties
+    below the `gte` threshold, or beyond `max_edges`, are folded into a single `other` edge.
+    """
+    edges = sorted(
+        [
+            FlowEdge(counterparty=counterparty, amount=amount, count=count)
+            for counterparty, (amount, count) in totals.items()
+        ],
+        key=lambda x: x.amount,
+        reverse=True,
+    )
+    kept = [x for x in edges if x.amount >= gte][:max_edges]
+    folded = edges[len(kept) :]
+    if folded:
+        kept.append(
+            FlowEdge(
+                counterparty="other",
+                amount=sum(x.amount for x in folded),
+                count=sum(x.count for x in folded),
+                counterparties=len(folded),
+            )
+        )
+    return kept
+
+
+def flow_graph_from_totals(
+    account_id: str,
+    start_date: str,
+    end_date: str,
+    gte: int,
+    totals: dict[str, dict[str, list[int]]],
+    max_edges: int,
+) -> FlowGraph:
+    return FlowGraph(
+        account=account_id,
+        start_date=start_date,
+        end_date=end_date,
+        gte=gte,
+        inbound=fold_flow_edges(totals["inbound"], gte, max_edges),
+        outbound=fold_flow_edges(totals["outbound"], gte, max_edges),
+        total_inbound=sum(x[0] for x in totals["inbound"].values()),
+        total_outbound=sum(x[0] for x in totals["outbound"].values()),
+    )
+
+
+@router.get(
+    "/{net}/account/{account_id}/flow/{gte}/{start_date}/{end_date}",
+    response_class=JSONResponse,
+)
+async def get_account_flow_graph(
+    request: Request,
+    net: str,
+    account_id: str,
+    gte: str,
+    start_date: str,
+    end_date: str,
+    max_edges: int = 25,
+    mongomotor: MongoMotor = Depends(get_mongo_motor),
+    blocks_per_day: dict[str, MongoTypeBlockPerDay] = Depends(get_blocks_per_day),
+    api_key: str = Security(API_KEY_HEADER),
+) -> FlowGraph:
+    """
+    Endpoint to get the aggregated CCD flow graph for a given account: inbound and outbound
+    totals per counterparty. `gte` is in CCD; counterparties with a smaller total, and those
+    beyond the largest `max_edges`, are folded into an `other` edge. Amounts are in microCCD.
+    """
+    if net not in ["mainnet", "testnet"]:
+        raise HTTPException(
+            status_code=404,
+            detail="Don't be silly. We only support mainnet and testnet.",
+        )
+
+    if max_edges < 1 or max_edges > 100:
+        raise HTTPException(
+            status_code=400,
+            detail="Max edges must be between 1 and 100.",
+        )
+
+    gte = parse_flow_threshold(gte) * 1_000_000
+    start_block, end_block = get_block_range_for_flow(
+        blocks_per_day, start_date, end_date
+    )
+    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
+
+    def transfers(field: str, direction: str):
+        return {
+            "$map": {
+                "input": {"$ifNull": [f"$balance_movement.{field}", []]},
+                "as": "t",
+                "in": {
+                    "direction": direction,
+                    "counterparty": "$$t.counterparty",
+                    "amount": "$$t.amount",
+                },
+            }
+        }
+
+    pipeline = [
+        {
+            "$match": {"impacted_address_canonical": {"$eq": account_id[:29]}},
+        },
+        {"$match": {"included_in_flow": True}},
+        {"$match": {"block_height": {"$gt": start_block, "$lte": end_block}}},
+        {
+            "$project": {
+                "_id": 0,
+                "transfers": {
+                    "$concatArrays": [
+                        transfers("transfer_in", "inbound"),
+                        transfers("transfer_out", "outbound"),
+                    ]
+                },
+            }
+        },
+        {"$unwind": "$transfers"},
+        {
+            "$group": {
+                "_id": {
+                    "direction": "$transfers.direction",
+                    "counterparty": "$transfers.counterparty",
+                },
+                "amount": {"$sum": "$transfers.amount"},
+                "count": {"$sum": 1},
+            }
+        },
+    ]
+    try:
+        result = (
+            await db_to_use[Collections.impacted_addresses]
+            .aggregate(pipeline)
+            .to_list(length=None)
+        )
+    except Exception as error:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Can't determine the flow for account {account_id} on {net} with error {error}.",
+        )
+
+    totals = {"inbound": {}, "outbound": {}}
+    for x in result:
+        totals[x["_id"]["direction"]][x["_id"]["counterparty"]] = [
+            x["amount"],
+            x["count"],
+        ]
+    return flow_graph_from_totals(
+        account_id, start_date, end_date, gte, totals, max_edges
+    )
+
+
+@router.get(
+    "/{net}/account/{account_id}/token-flow/{token_address}/{gte}/{start_date}/{end_date}",
+    response_class=JSONResponse,
+)
+async def get_account_token_flow_graph(
+    request: Request,
+    net: str,
+    account_id: str,
+    token_address: str,
+    gte: str,
+    start_date: str,
+    end_date: str,
+    max_edges: int = 25,
+    mongomotor: MongoMotor = Depends(get_mongo_motor),
+    blocks_per_day: dict[str, MongoTypeBlockPerDay] = Depends(get_blocks_per_day),
+    api_key: str = Security(API_KEY_HEADER),
+) -> FlowGraph:
+    """
+    Endpoint to get the aggregated flow graph for a CIS-2 token for a given account: inbound
+    and outbound totals per counterparty, with mints and burns as `mint` and `burn`.
+    `gte` is in whole tokens for tagged fungible tokens, otherwise in raw token amount.
+    Counterparties below `gte`, and those beyond the largest `max_edges`, are folded into an
+    `other` edge. Amounts are raw token amounts.
+    """
+    if net not in ["mainnet", "testnet"]:
+        raise HTTPException(
+            status_code=404,
+            detail="Don't be silly. We only support mainnet and testnet.",
+        )
+
+    if max_edges < 1 or max_edges > 100:
+        raise HTTPException(
+            status_code=400,
+            detail="Max edges must be between 1 and 100.",
+        )
+
+    gte = parse_flow_threshold(gte)
+    start_block, end_block = get_block_range_for_flow(
+        blocks_per_day, start_date, end_date
+    )
+    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
+
+    token_tag = await db_to_use[Collections.tokens_tags].find_one(
+        {"contracts": token_address.split("-")[0]}, {"decimals": 1}
+    )
+    if token_tag and token_tag.get("decimals"):
+        gte = gte * 10 ** token_tag["decimals"]
+
+    account = account_id[:29]
+    pipeline = [
+        {
+            "$match": {
+                "$or": [
+                    {"to_address_canonical": account},
+                    {"from_address_canonical": account},
+                ]
+            }
+        },
+        {"$match": {"block_height": {"$gt": start_block, "$lte": end_block}}},
+        {"$match": {"token_address": token_address}},
+        {
+            "$project": {
+                "_id": 0,
+                "result": 1,
+                "to_address_canonical": 1,
+                "from_address_canonical": 1,
+            }
+        },
+    ]
+    totals = {"inbound": {}, "outbound": {}}
+    try:
+        # a streaming reduction, token amounts don't fit in Mongo numbers.
+        async for x in db_to_use[Collections.tokens_logged_events].aggregate(pipeline):
+            amount = int(x["result"].get("token_amount", 0))
+            inbound = x.get("to_address_canonical") == account
+            outbound = x.get("from_address_canonical") == account
+            if inbound == outbound:
+                continue
+            if inbound:
+                direction = "inbound"
+                counterparty = x["result"].get("from_address") or "mint"
+            else:
+                direction = "outbound"
+                counterparty = x["result"].get("to_address") or "burn"
+            edge = totals[direction].setdefault(counterparty, [0, 0])
+            edge[0] += amount
+            edge[1] += 1
+    except Exception as error:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Can't determine the token flow for account {account_id} on {net} with error {error}.",
+        )
+
+    return flow_graph_from_totals(
+        account_id, start_date, end_date, gte, totals, max_edges
+    )
+
+
+def sum_of_rewards(rewards: dict | None, prefix: str) -> int:
+    if not rewards:
+        return 0
+    return sum(rewards.get(f"{prefix}{t}", 0) for t in REWARD_TYPES)
+
+
+def account_rewards_total_from_rows(
+    end_row: dict, start_row: dict | None, opening_row: dict | None
+) -> int:
+    """
+    Rewards between two rows of the daily rewards rollup: the running totals of
+    `end_row` minus those of `start_row` (the last row before the range, if any),
+    plus the pre-payday rewards of the opening row. Pre-payday rewards are not
+    dated, so they are always included, as when summing from the source.
+    """
+    return (
+        sum_of_rewards(end_row, "cum_")
+        - sum_of_rewards(start_row, "cum_")
+        + sum_of_rewards(opening_row, "")
+    )
+
+
+async def get_account_rewards_total_from_rollup(
+    mongomotor: MongoMotor,
+    net: str,
+    account: str,
+    first_date: str,
+    end_date: str,
+    block_height: int,
+) -> int:
+    """
+    Rewards for an account from `first_date` up to and including `end_date`,
+    from the daily rewards rollup, plus all pre-payday rewards. Rewards in
+    blocks after `block_height`, the high-water mark of the rollup, are summed
+    from the source.
+    """
+    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
+    pipeline = [
+        {
+            "$match": {
+                "impacted_address_canonical": {"$eq": account},
+                "effect_type": "Account Reward",
+                "block_height": {"$gt": block_height},
+                "date": {"$gte": first_date, "$lte": end_date},
+            }
+        },
+        {
+            "$group": {
+                "_id": None,
+                **{
+                    f"sum_{t}": {"$sum": f"$balance_movement.{t}"} for t in REWARD_TYPES
+                },
+            }
+        },
+    ]
+    rewards_after_rollup = (
+        await db_to_use[Collections.impacted_addresses]
+        .aggregate(pipeline)
+        .to_list(length=None)
+    )
+    rewards_after_rollup = sum_of_rewards(
+        rewards_after_rollup[0] if rewards_after_rollup else None, "sum_"
+    )
+
+    collection = get_api_db(mongomotor, net)[
+        CollectionsAPI.account_rewards_per_day.value
+    ]
+    end_row = await collection.find_one(
+        {"_id": {"$gte": f"{account}-", "$lte": f"{account}-{end_date}"}},
+        sort=[("_id", DESCENDING)],
+    )
+    if not end_row:
+        # no rewards in the rollup, so only pre-payday rewards remain.
+        account_rewards_pre_payday = await db_to_use[
+            Collections.impacted_addresses_pre_payday
+        ].find_one({"impacted_address_canonical": {"$eq": account}})
+        return sum_of_rewards(account_rewards_pre_payday, "sum_") + rewards_after_rollup
+
+    start_row = await collection.find_one(
+        {"_id": {"$gte": f"{account}-", "$lt": f"{account}-{first_date}"}},
+        sort=[("_id", DESCENDING)],
+    )
+    if start_row and start_row["date"] == PRE_PAYDAY_DATE:
+        opening_row = start_row
+    else:
+        opening_row = await collection.find_one({"_id": f"{account}-{PRE_PAYDAY_DATE}"})
+    return (
+        account_rewards_total_from_rows(end_row, start_row, opening_row)
+        + rewards_after_rollup
+    )
+
+
 @router.get(
     "/{net}/account/{account_id}/rewards-for-flow/{start_date}/{end_date}",
     response_class=JSONResponse,
@@ -1759,20 +2391,34 @@ async def get_account_rewards_for_flow_graph(
     amended_start_date = (
         f"{(dateutil.parser.parse(start_date)-dt.timedelta(days=1)):%Y-%m-%d}"
     )
-    start_block = blocks_per_day.get(amended_start_date)
-    if start_block:
-        start_block = start_block.height_for_first_block
-    else:
-        start_block = 0
+    try:
+        state = await get_rollup_state(
+            mongomotor, "mainnet", CollectionsAPI.account_rewards_per_day.value
+        )
+        if state["caught_up"]:
+            return await get_account_rewards_total_from_rollup(
+                mongomotor,
+                "mainnet",
+                account_id[:29],
+                amended_start_date,
+                end_date,
+                state["block_height"],
+            )
 
-    end_block = blocks_per_day.get(end_date)
-    if end_block:
-        end_block = end_block.height_for_last_block
-    else:
-        end_block = 1_000_000_000
+        # the rollup is still being built, so sum from the source.
+        start_block = blocks_per_day.get(amended_start_date)
+        if start_block:
+            start_block = start_block.height_for_first_block
+        else:
+            start_block = 0
 
-    db_to_use = mongomotor.mainnet
-    try:
+        end_block = blocks_per_day.get(end_date)
+        if end_block:
+            end_block = end_block.height_for_last_block
+        else:
+            end_block = 1_000_000_000
+
+        db_to_use = mongomotor.mainnet
         pipeline = [
             {
                 "$match": {"impacted_address_canonical": {"$eq": account_id[:29]}},
@@ -1799,37 +2445,14 @@ async def get_account_rewards_for_flow_graph(
             .aggregate(pipeline)
             .to_list(length=None)
         )
-        if len(rewards_for_account) > 0:
-            rewards_for_account = rewards_for_account[0]
-        else:
-            rewards_for_account = {
-                "sum_transaction_fee_reward": 0,
-                "sum_baker_reward": 0,
-                "sum_finalization_reward": 0,
-            }
+        account_rewards_total = sum_of_rewards(
+            rewards_for_account[0] if rewards_for_account else None, "sum_"
+        )
 
         account_rewards_pre_payday = await db_to_use[
             Collections.impacted_addresses_pre_payday
         ].find_one({"impacted_address_canonical": {"$eq": account_id[:29]}})
-        if account_rewards_pre_payday:
-            account_rewards_total = account_rewards_pre_payday[
-                "sum_transaction_fee_reward"
-            ]
-            +account_rewards_pre_payday["sum_baker_reward"]
-            +account_rewards_pre_payday["sum_finalization_reward"]
-            rewards_for_account["sum_transaction_fee_reward"]
-            +rewards_for_account["sum_baker_reward"]
-            +rewards_for_account["sum_finalization_reward"]
-
-        else:
-            if len(rewards_for_account) > 0:
-                account_rewards_total = (
-                    rewards_for_account["sum_transaction_fee_reward"]
-                    + rewards_for_account["sum_baker_reward"]
-                    + rewards_for_account["sum_finalization_reward"]
-                )
-            else:
-                account_rewards_total = 0
+        account_rewards_total += sum_of_rewards(account_rewards_pre_payday, "sum_")
 
         return account_rewards_total
 
@@ -1840,6 +2463,53 @@ async def get_account_rewards_for_flow_graph(
         )
 
 
+async def get_account_creation_txs(
+    mongomotor: MongoMotor, net: str, account_addresses: list[str]
+) -> dict[str, CCD_BlockItemSummary | None]:
+    """
+    The account creation transactions for a list of accounts, with one query.
+    Accounts that existed in the genesis block map to `None`.
+    """
+    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
+    state = await get_rollup_state(
+        mongomotor, net, CollectionsAPI.account_creations.value
+    )
+    txs = {}
+    missing = account_addresses
+    query = {"account_creation": {"$exists": True}}
+    if state["caught_up"]:
+        tx_hashes = [
+            x["tx_hash"]
+            for x in await get_api_db(mongomotor, net)[
+                CollectionsAPI.account_creations.value
+            ]
+            .find({"_id": {"$in": account_addresses}})
+            .to_list(length=None)
+        ]
+        txs = {
+            x["account_creation"]["address"]: CCD_BlockItemSummary(**x)
+            for x in await db_to_use[Collections.transactions]
+            .find({"_id": {"$in": tx_hashes}})
+            .to_list(length=None)
+        }
+        missing = [x for x in account_addresses if x not in txs]
+        # the lookup collection lags behind, so accounts created after its
+        # high-water mark are searched for in the newer transactions.
+        query["block_info.height"] = {"$gt": state["block_height"]}
+
+    if missing:
+        query["account_creation.address"] = {"$in": missing}
+        txs.update(
+            {
+                x["account_creation"]["address"]: CCD_BlockItemSummary(**x)
+                for x in await db_to_use[Collections.transactions]
+                .find(query)
+                .to_list(length=None)
+            }
+        )
+    return {address: txs.get(address) for address in account_addresses}
+
+
 @router.get(
     "/{net}/account/{account_id}/deployed",
     response_class=JSONResponse,
@@ -1860,21 +2530,54 @@ async def get_account_deployment_tx(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    db_to_use = mongodb.testnet if net == "testnet" else mongodb.mainnet
+    result = await get_account_creation_txs(mongodb, net, [account_id])
+    # None if the account existed in genesis block
+    return result[account_id]
+
+
+async def get_account_aliases(
+    mongomotor: MongoMotor, net: str, account_address: str
+) -> list[str]:
+    """
+    All addresses in use for the canonical account of `account_address`,
+    including the account address itself. Use this to expand a query on an
+    address to all its aliases, for example with
+    `{"impacted_address": {"$in": aliases}}`.
+    """
+    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
     pipeline = [
-        {"$match": {"account_creation": {"$exists": True}}},
-        {"$match": {"account_creation.address": account_id}},
+        {
+            "$match": {"effect_type": {"$ne": "data_registered"}},
+        },
+        {
+            "$match": {"impacted_address_canonical": {"$eq": account_address[:29]}},
+        },
+        {
+            "$group": {
+                "_id": "$impacted_address",
+            }
+        },
     ]
-    result = (
-        await db_to_use[Collections.transactions].aggregate(pipeline).to_list(length=1)
+    aliases = set()
+    state = await get_rollup_state(
+        mongomotor, net, CollectionsAPI.account_aliases.value
     )
+    if state["caught_up"]:
+        result = await get_api_db(mongomotor, net)[
+            CollectionsAPI.account_aliases.value
+        ].find_one({"_id": account_address[:29]})
+        aliases.update(result["aliases"] if result else [])
+        # the alias sets lag behind, so only addresses after their high-water
+        # mark are grouped from impacted addresses.
+        pipeline.insert(0, {"$match": {"block_height": {"$gt": state["block_height"]}}})
 
-    if len(result) > 0:
-        result = CCD_BlockItemSummary(**result[0])
-        return result
-    else:
-        # account existed in genesis block
-        return None
+    result = (
+        await db_to_use[Collections.impacted_addresses]
+        .aggregate(pipeline)
+        .to_list(length=None)
+    )
+    aliases.update(x["_id"] for x in result)
+    return sorted(aliases)
 
 
 @router.get(
@@ -1899,30 +2602,120 @@ async def get_aliases_in_use_for_account(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
-    pipeline = [
-        {
-            "$match": {"effect_type": {"$ne": "data_registered"}},
-        },
-        {
-            "$match": {"impacted_address_canonical": {"$eq": account_address[:29]}},
-        },
-        {
-            "$group": {
-                "_id": "$impacted_address",
-            }
-        },
-        {
-            "$project": {
-                "_id": 1,
-            }
-        },
+    aliases = [
+        {"_id": x}
+        for x in await get_account_aliases(mongomotor, net, account_address)
+        if x != account_address
     ]
-    result = (
-        await db_to_use[Collections.impacted_addresses]
-        .aggregate(pipeline)
-        .to_list(length=None)
+    return aliases
+
+
+OVERVIEW_FIELDS = [
+    "info",
+    "balance",
+    "balance_USD",
+    "tokens_available",
+    "rewards_available",
+    "apy_data",
+    "deployed",
+    "aliases_in_use",
+    "transactions",
+    "project",
+]
+
+
+@router.get("/{net}/account/{index_or_hash}/overview", response_class=JSONResponse)
+async def get_account_overview(
+    request: Request,
+    net: str,
+    index_or_hash: int | str,
+    fields: str | None = None,
+    grpcclient: GRPCClient = Depends(get_grpcclient),
+    mongomotor: MongoMotor = Depends(get_mongo_motor),
+    exchange_rates: dict = Depends(get_exchange_rates),
+    api_key: str = Security(API_KEY_HEADER),
+) -> dict:
+    """
+    Endpoint to get everything an account page needs in one call: the results of `info`,
+    `balance`, `balance/USD`, `tokens-available`, `rewards-available`, `apy-data`, `deployed`,
+    `aliases-in-use` and `transactions/0/20`, and the project the account belongs to
+    (if any). The account info is retrieved once and shared,
+    all other lookups run concurrently. Use `fields` (comma separated) to select a subset.
+    Lookups that fail are `null`, with their error in `errors`.
+    """
+    if net not in ["mainnet", "testnet"]:
+        raise HTTPException(
+            status_code=404,
+            detail="Don't be silly. We only support mainnet and testnet.",
+        )
+
+    requested = fields.split(",") if fields else OVERVIEW_FIELDS
+    unknown = [x for x in requested if x not in OVERVIEW_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields {', '.join(unknown)}. Choose from {', '.join(OVERVIEW_FIELDS)}.",
+        )
+
+    account_info: CCD_AccountInfo = await get_account_info(
+        request, net, index_or_hash, grpcclient=grpcclient, mongomotor=mongomotor
     )
+    account_address = account_info.address
+    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
 
-    aliases = [x for x in result if x["_id"] != account_address]
-    return aliases
+    async def tokens_available():
+        result = await db_to_use[Collections.tokens_links_v3].find_one(
+            {"account_address_canonical": account_address[:29]}, {"_id": 1}
+        )
+        return result is not None
+
+    async def apy_data():
+        validator = account_info.stake.baker if account_info.stake else None
+        apy_id = validator.baker_info.baker_id if validator else account_address
+        return await get_account_apy_data(
+            request, net, str(apy_id), mongomotor=mongomotor, grpcclient=grpcclient
+        )
+
+    # these follow from the shared account info.
+    overview = {"account_address": account_address, "errors": {}}
+    if "info" in requested:
+        overview["info"] = account_info
+    if "balance" in requested:
+        overview["balance"] = account_info.amount
+    if "balance_USD" in requested:
+        rate = exchange_rates["CCD"]["rate"]
+        overview["balance_USD"] = (account_info.amount / 1_000_000) * rate
+    if "project" in requested:
+        overview["project"] = get_project_attribution(
+            net, account_address
+        ) or get_project_attribution(net, account_info.index)
+
+    components = {
+        "tokens_available": tokens_available,
+        "rewards_available": lambda: get_bool_account_rewards_available(
+            request, net, account_address, mongomotor=mongomotor
+        ),
+        "apy_data": apy_data,
+        "deployed": lambda: get_account_deployment_tx(
+            request, net, account_address, mongodb=mongomotor
+        ),
+        "aliases_in_use": lambda: get_aliases_in_use_for_account(
+            request, net, account_address, mongomotor=mongomotor
+        ),
+        "transactions": lambda: get_account_txs(
+            request, net, account_address, 0, 20, mongomotor=mongomotor
+        ),
+    }
+    requested_components = [x for x in requested if x in components]
+    results = await asyncio.gather(
+        *[components[x]() for x in requested_components], return_exceptions=True
+    )
+    for field, result in zip(requested_components, results):
+        if isinstance(result, Exception):
+            overview[field] = None
+            overview["errors"][field] = (
+                result.detail if isinstance(result, HTTPException) else str(result)
+            )
+        else:
+            overview[field] = result
+    return overview
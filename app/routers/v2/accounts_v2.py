@@ -2,20 +2,32 @@ from ccdexplorer_fundamentals.mongodb import (
     Collections,
     MongoMotor,
     MongoTypePayday,
-    MongoTypePaydaysPerformance,
 )
-from ccdexplorer_fundamentals.node import ConcordiumNodeFromDashboard
 from ccdexplorer_fundamentals.enums import NET
 from ccdexplorer_fundamentals.GRPCClient import GRPCClient
-from ccdexplorer_fundamentals.GRPCClient.CCD_Types import CCD_BlockItemSummary
 from fastapi import APIRouter, Depends, HTTPException, Request, Security
 from app.ENV import API_KEY_HEADER
-from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+import asyncio
 import json
+from app.apy import get_apy_lookup, lookup_apy
+from app.cache import LRUCache
+from app.nodes_validators import (
+    NODES_VALIDATORS_MAPS,
+    get_nodes_validators_snapshot,
+    nodes_validators_response_body,
+)
 from app.state_getters import get_mongo_motor, get_grpcclient
+from app.routers.v2.account_v2 import get_account_creation_txs
 
 router = APIRouter(tags=["Accounts"], prefix="/v2")
 
+# the newest accounts, keyed on the newest account index, so a new account
+# is shown right away. Balances in the account info may lag a few seconds.
+last_accounts_cache = LRUCache(maxsize=16, ttl=15)
+LAST_ACCOUNTS_NODE_CONCURRENCY = 10
+
 
 @router.get("/{net}/accounts/info/count", response_class=JSONResponse)
 async def get_accounts_count_estimate(
@@ -233,42 +245,47 @@ async def get_last_accounts(
     db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
     count = min(50, max(count, 1))
     error = None
+    accounts = []
     try:
-        result = [
-            x["account_index"]
-            for x in await db_to_use[Collections.all_account_addresses]
-            .find({}, {"account_index": 1, "_id": 0})
+        result = (
+            await db_to_use[Collections.all_account_addresses]
+            .find({}, {"account_index": 1, "account_address": 1, "_id": 0})
             .sort({"account_index": -1})
             .to_list(count)
-        ]
+        )
 
-        accounts = []
-        for account_index in result:
-            account_info = grpcclient.get_account_info(
-                "last_final", account_index=account_index, net=NET(net)
+        key = (net, result[0]["account_index"], count) if result else None
+        accounts = last_accounts_cache.get(key)
+        if not accounts:
+            semaphore = asyncio.Semaphore(LAST_ACCOUNTS_NODE_CONCURRENCY)
+
+            async def get_account_info(account_index: int):
+                async with semaphore:
+                    return await asyncio.to_thread(
+                        grpcclient.get_account_info,
+                        "last_final",
+                        account_index=account_index,
+                        net=NET(net),
+                    )
+
+            # the node and the database are asked at the same time.
+            *account_infos, deployment_txs = await asyncio.gather(
+                *[get_account_info(x["account_index"]) for x in result],
+                get_account_creation_txs(
+                    mongomotor, net, [x["account_address"] for x in result]
+                ),
             )
-
-            pipeline = [
-                {"$match": {"account_creation": {"$exists": True}}},
-                {"$match": {"account_creation.address": account_info.address}},
+            accounts = [
+                {"account_info": x, "deployment_tx": deployment_txs.get(x.address)}
+                for x in account_infos
             ]
-            result = (
-                await db_to_use[Collections.transactions]
-                .aggregate(pipeline)
-                .to_list(length=1)
-            )
-
-            if len(result) > 0:
-                result = CCD_BlockItemSummary(**result[0])
-            else:
-                result = None
-            accounts.append({"account_info": account_info, "deployment_tx": result})
+            last_accounts_cache.set(key, accounts)
 
     except Exception as error:  # noqa: F811
         print(error)
         result = None
 
-    if result:
+    if accounts:
         return accounts
     else:
         error = None
@@ -282,11 +299,14 @@ async def get_last_accounts(
 async def get_nodes_and_validators(
     request: Request,
     net: str,
+    maps: str | None = None,
     mongomotor: MongoMotor = Depends(get_mongo_motor),
     api_key: str = Security(API_KEY_HEADER),
 ) -> dict:
     """
-    Endpoint to get nodes and validators.
+    Endpoint to get nodes and validators, from a snapshot that is rebuilt in the
+    background when the node dashboard refreshes. Use `maps` (comma separated) to
+    select a subset of the maps. Validators are only included for mainnet.
 
     """
     if net not in ["mainnet", "testnet"]:
@@ -295,81 +315,89 @@ async def get_nodes_and_validators(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
+    requested = maps.split(",") if maps else NODES_VALIDATORS_MAPS
+    unknown = [x for x in requested if x not in NODES_VALIDATORS_MAPS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown maps {', '.join(unknown)}. Choose from {', '.join(NODES_VALIDATORS_MAPS)}.",
+        )
 
-    all_nodes = (
-        await db_to_use[Collections.dashboard_nodes].find({}).to_list(length=None)
+    snapshot = await get_nodes_validators_snapshot(mongomotor, net)
+    return Response(
+        content=nodes_validators_response_body(snapshot, requested),
+        media_type="application/json",
     )
-    all_nodes_by_node_id = {x["nodeId"]: x for x in all_nodes}
 
-    if net == "mainnet":
-        all_validators = [
-            x
-            for x in await db_to_use[Collections.paydays_current_payday]
-            .find({})
-            .to_list(length=None)
-        ]
 
-        all_validators_by_validator_id = {x["baker_id"]: x for x in all_validators}
-
-        validator_nodes_by_validator_id = {
-            x["consensusBakerId"]: {
-                "node": ConcordiumNodeFromDashboard(**x),
-                "validator": all_validators_by_validator_id[str(x["consensusBakerId"])],
-            }
-            for x in all_nodes
-            if x["consensusBakerId"] is not None
-            if str(x["consensusBakerId"]) in all_validators_by_validator_id.keys()
-        }
-
-        validator_nodes_by_account_id = {
-            all_validators_by_validator_id[str(x["consensusBakerId"])]["pool_status"][
-                "address"
-            ]: {
-                "node": ConcordiumNodeFromDashboard(**x),
-                "validator": all_validators_by_validator_id[str(x["consensusBakerId"])],
-            }
-            for x in all_nodes
-            if x["consensusBakerId"] is not None
-            if str(x["consensusBakerId"]) in all_validators_by_validator_id.keys()
-        }
-
-        non_validator_nodes_by_node_id = {
-            x["nodeId"]: {"node": ConcordiumNodeFromDashboard(**x), "validator": None}
-            for x in all_nodes
-            if x["consensusBakerId"] is None
-        }
-
-        non_reporting_validators_by_validator_id = {
-            x["baker_id"]: {
-                "node": None,
-                "validator": all_validators_by_validator_id[str(x["baker_id"])],
-            }
-            for x in all_validators
-            if x["baker_id"] not in validator_nodes_by_validator_id.keys()
-        }
-
-        non_reporting_validators_by_account_id = {
-            all_validators_by_validator_id[x["baker_id"]]["pool_status"]["address"]: {
-                "node": None,
-                "validator": all_validators_by_validator_id[str(x["baker_id"])],
-            }
-            for x in all_validators
-            if x["baker_id"] not in validator_nodes_by_validator_id.keys()
-        }
-
-    result_dict = {"all_nodes_by_node_id": all_nodes_by_node_id}
-    if net == "mainnet":
-        result_dict.update(
-            {
-                "all_validators_by_validator_id": all_validators_by_validator_id,
-                "validator_nodes_by_account_id": validator_nodes_by_account_id,
-                "non_validator_nodes_by_node_id": non_validator_nodes_by_node_id,
-                "non_reporting_validators_by_validator_id": non_reporting_validators_by_validator_id,
-                "non_reporting_validators_by_account_id": non_reporting_validators_by_account_id,
-            }
+# the payday pools table only changes once per payday.
+payday_pools_cache = LRUCache(maxsize=16)
+NO_APY = {"apy": 0.0, "sum_of_rewards": 0, "count_of_days": 0}
+
+
+def last_apy(apy_object: dict, period: str) -> dict:
+    # the APY dicts are keyed on date, the last entry is the most recent one.
+    apy_dict = apy_object.get(f"{period}_apy_dict")
+    return apy_dict[next(reversed(apy_dict))] if apy_dict else NO_APY
+
+
+def payday_pools_columns(
+    performance: list[dict], apy_objects: dict[str, dict]
+) -> dict[str, list]:
+    """
+    The payday pools table as columns, one list per field, aligned on `baker_id`.
+    Fields are read from the stored documents directly and the percentages are
+    computed over whole columns.
+    """
+    pool_status = [x["pool_status"] for x in performance]
+    pool_info = [x.get("pool_info") or {} for x in pool_status]
+    current_payday_info = [x.get("current_payday_info") or {} for x in pool_status]
+    columns = {
+        "baker_id": [x["baker_id"] for x in performance],
+        "block_commission_rate": [
+            x.get("commission_rates", {}).get("baking") for x in pool_info
+        ],
+        "tx_commission_rate": [
+            x.get("commission_rates", {}).get("transaction") for x in pool_info
+        ],
+        "expectation": [float(x["expectation"]) for x in performance],
+        "lottery_power": [x.get("lottery_power") for x in current_payday_info],
+        "url": [x.get("url") for x in pool_info],
+        "effective_stake": [
+            int(x["effective_stake"]) if "effective_stake" in x else None
+            for x in current_payday_info
+        ],
+        "delegated_capital": [
+            int(x.get("delegated_capital") or 0) for x in pool_status
+        ],
+        "delegated_capital_cap": [
+            int(x.get("delegated_capital_cap") or 0) for x in pool_status
+        ],
+        "baker_equity_capital": [
+            int(x["baker_equity_capital"]) if "baker_equity_capital" in x else None
+            for x in current_payday_info
+        ],
+    }
+    columns["delegated_percentage"] = [
+        (capital / cap) * 100 if cap > 0 else 0
+        for capital, cap in zip(
+            columns["delegated_capital"], columns["delegated_capital_cap"]
         )
-    return result_dict
+    ]
+    columns["delegated_percentage_remaining"] = [
+        100 - x for x in columns["delegated_percentage"]
+    ]
+    for period in ["d30", "d90", "d180"]:
+        columns[period] = [
+            last_apy(apy_objects.get(baker_id, {}), period)
+            for baker_id in columns["baker_id"]
+        ]
+    return columns
+
+
+def payday_pools_rows(columns: dict[str, list]) -> dict[str, dict]:
+    names = list(columns.keys())
+    return {row[0]: dict(zip(names, row)) for row in zip(*[columns[x] for x in names])}
 
 
 @router.get("/{net}/accounts/paydays/pools/{status}", response_class=JSONResponse)
@@ -377,11 +405,14 @@ async def get_payday_pools(
     request: Request,
     net: str,
     status: str,
+    columnar: bool = False,
     mongomotor: MongoMotor = Depends(get_mongo_motor),
     api_key: str = Security(API_KEY_HEADER),
 ) -> dict:
     """
-    Endpoint to get payday pools.
+    Endpoint to get payday pools, by baker id. The table is computed once per
+    payday. With `columnar`, the table is returned as one list per field.
+    The delegation pie is left to the client, from `delegated_percentage`.
     """
     if net not in ["mainnet", "testnet"]:
         raise HTTPException(
@@ -390,131 +421,47 @@ async def get_payday_pools(
         )
 
     db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
-    last_payday = MongoTypePayday(
-        **await db_to_use[Collections.paydays].find_one(sort=[("date", -1)])
+    last_payday_id = await db_to_use[Collections.paydays].find_one(
+        {}, {"_id": 1}, sort=[("date", -1)]
     )
-    pools_for_status = last_payday.pool_status_for_bakers[status]
-    result = (
-        await mongomotor.mainnet[Collections.paydays_current_payday]
-        .find()
-        .to_list(100_000)
-    )
-    last_payday_performance = {
-        x["baker_id"]: MongoTypePaydaysPerformance(
-            **x
-        )  # .model_dump(exclude_none=True)
-        for x in result
-        if (
-            (str(x["baker_id"]).isnumeric())
-            and (int(x["baker_id"]) in pools_for_status)
+    key = (net, status, last_payday_id["_id"] if last_payday_id else None)
+    if key not in payday_pools_cache:
+        last_payday = MongoTypePayday(
+            **await db_to_use[Collections.paydays].find_one(sort=[("date", -1)])
         )
-    }
-    result = (
-        await mongomotor.mainnet[Collections.paydays_apy_intermediate]
-        .find({"_id": {"$in": list(last_payday_performance.keys())}})
-        .to_list(100_000)
-    )
-    last_payday_apy_objects = {x["_id"]: x for x in result}
-
-    dd = {}
-    for baker_id in last_payday_performance.keys():
-        # print(baker_id)
-        if "d30_apy_dict" in last_payday_apy_objects[baker_id]:
-            if last_payday_apy_objects[baker_id]["d30_apy_dict"] is not None:
-                d30_day = list(
-                    last_payday_apy_objects[baker_id]["d30_apy_dict"].keys()
-                )[-1]
-            else:
-                d30_day = None
-        else:
-            d30_day = None
-
-        if "d90_apy_dict" in last_payday_apy_objects[baker_id]:
-            if last_payday_apy_objects[baker_id]["d90_apy_dict"] is not None:
-                d90_day = list(
-                    last_payday_apy_objects[baker_id]["d90_apy_dict"].keys()
-                )[-1]
-            else:
-                d90_day = None
-        else:
-            d90_day = None
-
-        if "d180_apy_dict" in last_payday_apy_objects[baker_id]:
-            if last_payday_apy_objects[baker_id]["d180_apy_dict"] is not None:
-                d180_day = list(
-                    last_payday_apy_objects[baker_id]["d180_apy_dict"].keys()
-                )[-1]
-            else:
-                d180_day = None
-        else:
-            d180_day = None
-
-        delegated_percentage = (
-            (
-                last_payday_performance[baker_id].pool_status.delegated_capital
-                / last_payday_performance[baker_id].pool_status.delegated_capital_cap
+        pools_for_status = last_payday.pool_status_for_bakers[status]
+        result = (
+            await mongomotor.mainnet[Collections.paydays_current_payday]
+            .find()
+            .to_list(100_000)
+        )
+        performance = [
+            x
+            for x in result
+            if (
+                (str(x["baker_id"]).isnumeric())
+                and (int(x["baker_id"]) in pools_for_status)
             )
-            * 100
-            if last_payday_performance[baker_id].pool_status.delegated_capital_cap > 0
-            else 0
-        )
-
-        delegated_percentage_remaining = 100 - delegated_percentage
-        pie = (
-            f"<style> .pie_{baker_id} {{\n"
-            f"width: 20px;\nheight: 20px;\n"
-            f"background-image: conic-gradient(#AE7CF7 0%, #AE7CF7 {delegated_percentage}%, #70B785 0%, #70B785 {delegated_percentage_remaining}%);\n"
-            f" border-radius: 50%\n"
-            f"}}\n</style>\n"
-        )
-
-        d = {
-            "baker_id": baker_id,
-            "block_commission_rate": last_payday_performance[
-                baker_id
-            ].pool_status.pool_info.commission_rates.baking,
-            "tx_commission_rate": last_payday_performance[
-                baker_id
-            ].pool_status.pool_info.commission_rates.transaction,
-            "expectation": last_payday_performance[baker_id].expectation,
-            "lottery_power": last_payday_performance[
-                baker_id
-            ].pool_status.current_payday_info.lottery_power,
-            "url": last_payday_performance[baker_id].pool_status.pool_info.url,
-            "effective_stake": last_payday_performance[
-                baker_id
-            ].pool_status.current_payday_info.effective_stake,
-            "delegated_capital": last_payday_performance[
-                baker_id
-            ].pool_status.delegated_capital,
-            "delegated_capital_cap": last_payday_performance[
-                baker_id
-            ].pool_status.delegated_capital_cap,
-            "baker_equity_capital": last_payday_performance[
-                baker_id
-            ].pool_status.current_payday_info.baker_equity_capital,
-            "delegated_percentage": delegated_percentage,
-            "delegated_percentage_remaining": delegated_percentage_remaining,
-            "pie": pie,
-            "d30": (
-                last_payday_apy_objects[baker_id].get("d30_apy_dict")[d30_day]
-                if d30_day
-                else {"apy": 0.0, "sum_of_rewards": 0, "count_of_days": 0}
-            ),
-            "d90": (
-                last_payday_apy_objects[baker_id].get("d90_apy_dict")[d90_day]
-                if d90_day
-                else {"apy": 0.0, "sum_of_rewards": 0, "count_of_days": 0}
-            ),
-            "d180": (
-                last_payday_apy_objects[baker_id].get("d180_apy_dict")[d180_day]
-                if d180_day
-                else {"apy": 0.0, "sum_of_rewards": 0, "count_of_days": 0}
-            ),
-        }
-        dd[baker_id] = d
-
-    return dd
+        ]
+        result = (
+            await mongomotor.mainnet[Collections.paydays_apy_intermediate]
+            .find({"_id": {"$in": [x["baker_id"] for x in performance]}})
+            .to_list(100_000)
+        )
+        apy_objects = {x["_id"]: x for x in result}
+        columns = payday_pools_columns(performance, apy_objects)
+        payday_pools_cache.set(
+            key,
+            {
+                "columns": JSONResponse(jsonable_encoder(columns)).body,
+                "rows": JSONResponse(jsonable_encoder(payday_pools_rows(columns))).body,
+            },
+        )
+
+    return Response(
+        content=payday_pools_cache.get(key)["columns" if columnar else "rows"],
+        media_type="application/json",
+    )
 
 
 @router.get(
@@ -573,7 +520,7 @@ async def get_payday_passive_info(
     api_key: str = Security(API_KEY_HEADER),
 ) -> dict:
     """
-    Endpoint to get payday passive information.
+    Endpoint to get payday passive information, from the APY lookup for the payday.
     """
     if net not in ["mainnet", "testnet"]:
         raise HTTPException(
@@ -581,35 +528,10 @@ async def get_payday_passive_info(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    passive_delegation_info = grpcclient.get_passive_delegation_info("last_final")
-    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
-    passive_delegation_apy_object = await db_to_use[
-        Collections.paydays_apy_intermediate
-    ].find_one({"_id": "passive_delegation"})
-
-    passive_delegation_rewards = {
-        "d30": {"sum_of_rewards": 0, "apy": 0},
-        "d90": {"sum_of_rewards": 0, "apy": 0},
-        "d180": {"sum_of_rewards": 0, "apy": 0},
-    }
-    if passive_delegation_apy_object:
-        d30_day = list(passive_delegation_apy_object["d30_apy_dict"].keys())[-1]
-        d90_day = list(passive_delegation_apy_object["d90_apy_dict"].keys())[-1]
-        d180_day = list(passive_delegation_apy_object["d180_apy_dict"].keys())[-1]
-
-        passive_delegation_rewards["d30"] = passive_delegation_apy_object[
-            "d30_apy_dict"
-        ][d30_day]
-        passive_delegation_rewards["d90"] = passive_delegation_apy_object[
-            "d90_apy_dict"
-        ][d90_day]
-        passive_delegation_rewards["d180"] = passive_delegation_apy_object[
-            "d180_apy_dict"
-        ][d180_day]
-
+    apy_lookup = await get_apy_lookup(mongomotor, grpcclient, net)
     return {
-        "passive_delegation_info": passive_delegation_info,
-        "passive_delegation_rewards": passive_delegation_rewards,
+        "passive_delegation_info": apy_lookup.passive_delegation_info,
+        "passive_delegation_rewards": lookup_apy(apy_lookup, "passive_delegation"),
     }
 
 
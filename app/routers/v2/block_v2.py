@@ -15,23 +15,72 @@ from ccdexplorer_fundamentals.mongodb import (
 )
 from fastapi import APIRouter, Depends, HTTPException, Request, Security
 from app.ENV import API_KEY_HEADER
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+import asyncio
+import hashlib
+import json
 import grpc
+from app.cache import LRUCache
+from app.paydays import get_payday_index, get_payday_reward_counts
 from app.state_getters import get_grpcclient, get_mongo_motor
 
 router = APIRouter(tags=["Block"], prefix="/v2")
 
 
+# finalized blocks never change, so they are kept under both height and hash.
+block_info_cache = LRUCache(maxsize=10_000)
+
+
+async def get_block_info(
+    mongomotor: MongoMotor, grpcclient: GRPCClient, net: str, height_or_hash: int | str
+) -> CCD_BlockInfo | None:
+    """
+    Resolve a block by height or hash: from memory, then from the `blocks`
+    collection (on its `height` index or `_id`), and only from the node for
+    blocks that are not stored yet. Only finalized blocks are cached.
+    """
+    block_info: CCD_BlockInfo | None = block_info_cache.get((net, height_or_hash))
+    if block_info:
+        return block_info
+
+    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
+    query = (
+        {"height": height_or_hash}
+        if isinstance(height_or_hash, int)
+        else {"_id": height_or_hash}
+    )
+    result = await db_to_use[Collections.blocks].find_one(query)
+    if result:
+        block_info = CCD_BlockInfo(**result)
+    else:
+        try:
+            block_info = await asyncio.to_thread(
+                grpcclient.get_block_info, height_or_hash, NET(net)
+            )
+        except grpc._channel._InactiveRpcError:
+            block_info = None
+        except ValueError:
+            block_info = None
+
+    if block_info and block_info.finalized:
+        block_info_cache.set((net, block_info.height), block_info)
+        block_info_cache.set((net, block_info.hash), block_info)
+    return block_info
+
+
 @router.get("/{net}/block/{height_or_hash}", response_class=JSONResponse)
 async def get_block_at_height_from_grpc(
     request: Request,
     net: str,
     height_or_hash: int | str,
+    mongomotor: MongoMotor = Depends(get_mongo_motor),
     grpcclient: GRPCClient = Depends(get_grpcclient),
     api_key: str = Security(API_KEY_HEADER),
 ) -> CCD_BlockInfo:
     """
-    Endpoint to get blockInfo from the node.
+    Endpoint to get blockInfo, from MongoDB collection `blocks`, or from the node
+    for blocks that are not stored yet.
     """
     if net not in ["mainnet", "testnet"]:
         raise HTTPException(
@@ -43,12 +92,7 @@ async def get_block_at_height_from_grpc(
         height_or_hash = int(height_or_hash)
     except ValueError:
         pass
-    try:
-        result = grpcclient.get_block_info(height_or_hash, NET(net))
-    except grpc._channel._InactiveRpcError:
-        result = None
-    except ValueError:
-        result = None
+    result = await get_block_info(mongomotor, grpcclient, net, height_or_hash)
 
     if result:
         return result
@@ -144,46 +188,12 @@ async def get_block_payday_true_false(
         pass
     db_to_use = mongomotor.mainnet
     try:
-        if isinstance(height_or_hash, int):
-            payday_result = await db_to_use[Collections.paydays].find_one(
-                {"height_for_last_block": height_or_hash - 1}
-            )
-        else:
-            payday_result = await db_to_use[Collections.paydays].find_one(
-                {"_id": height_or_hash}
-            )
+        payday = await get_payday_index(db_to_use).find(db_to_use, height_or_hash)
         # if True, this block has payday rewards
-        if payday_result:
-            result_pool_rewards = (
-                await db_to_use[Collections.paydays_rewards]
-                .aggregate(
-                    [
-                        {"$match": {"date": payday_result["date"]}},
-                        {"$match": {"pool_owner": {"$exists": True}}},
-                        {"$count": "count_of_pool_rewards"},
-                    ]
-                )
-                .to_list(length=None)
-            )
-            result_account_rewards = (
-                await db_to_use[Collections.paydays_rewards]
-                .aggregate(
-                    [
-                        {"$match": {"date": payday_result["date"]}},
-                        {"$match": {"account_id": {"$exists": True}}},
-                        {"$count": "count_of_account_rewards"},
-                    ]
-                )
-                .to_list(length=None)
-            )
+        if payday:
             return {
                 "is_payday": True,
-                "count_of_account_rewards": result_account_rewards[0][
-                    "count_of_account_rewards"
-                ],
-                "count_of_pool_rewards": result_pool_rewards[0][
-                    "count_of_pool_rewards"
-                ],
+                **await get_payday_reward_counts(db_to_use, payday),
             }
         else:
             return {"is_payday": False}
@@ -231,16 +241,14 @@ async def get_block_payday_pool_rewards(
 
     db_to_use = mongomotor.mainnet
     try:
-        payday_result = await db_to_use[Collections.paydays].find_one(
-            {"height_for_last_block": height - 1}
-        )
+        payday = await get_payday_index(db_to_use).find(db_to_use, height)
         # if True, this block has payday rewards
-        if payday_result:
+        if payday:
             result = (
                 await db_to_use[Collections.paydays_rewards]
                 .aggregate(
                     [
-                        {"$match": {"date": payday_result["date"]}},
+                        {"$match": {"date": payday.date}},
                         {"$match": {"pool_owner": {"$exists": True}}},
                         {
                             "$facet": {
@@ -309,16 +317,14 @@ async def get_block_payday_account_rewards(
 
     db_to_use = mongomotor.mainnet
     try:
-        payday_result = await db_to_use[Collections.paydays].find_one(
-            {"height_for_last_block": height - 1}
-        )
+        payday = await get_payday_index(db_to_use).find(db_to_use, height)
         # if True, this block has payday rewards
-        if payday_result:
+        if payday:
             result = (
                 await db_to_use[Collections.paydays_rewards]
                 .aggregate(
                     [
-                        {"$match": {"date": payday_result["date"]}},
+                        {"$match": {"date": payday.date}},
                         {"$match": {"account_id": {"$exists": True}}},
                         {
                             "$facet": {
@@ -351,11 +357,90 @@ async def get_block_payday_account_rewards(
         )
 
 
+# decoded special events of recently paged blocks, payday blocks have thousands.
+special_events_cache = LRUCache(maxsize=32)
+special_events_adapter = TypeAdapter(list[CCD_BlockSpecialEvent])
+
+
+def block_special_events_redis_key(net: str, height: int) -> str:
+    return f"api:block-special-events:{net}:{height}"
+
+
+def chain_parameters_redis_key(net: str) -> str:
+    # one hash per net, the content hash of the chain parameters as field.
+    return f"api:chain-parameters:{net}"
+
+
+def chain_parameters_at_block_redis_key(net: str) -> str:
+    # one hash per net, the block height as field, the content hash as value.
+    return f"api:chain-parameters-at-block:{net}"
+
+
+async def block_is_finalized(
+    mongomotor: MongoMotor, grpcclient: GRPCClient, net: str, height: int
+) -> bool:
+    block_info = await get_block_info(mongomotor, grpcclient, net, height)
+    return bool(block_info and block_info.finalized)
+
+
+async def get_block_special_events_json(
+    redis, mongomotor: MongoMotor, grpcclient: GRPCClient, net: str, height: int
+) -> bytes:
+    """
+    Special events for a block as a JSON encoded list. Special events of a
+    finalized block never change, so they are kept in Redis per (net, height)
+    and only asked from the node once.
+    """
+    key = block_special_events_redis_key(net, height)
+    cached = await redis.get(key)
+    if cached is not None:
+        return cached
+
+    special_events = await asyncio.to_thread(
+        grpcclient.get_block_special_events, height, net=NET(net)
+    )
+    special_events_json = special_events_adapter.dump_json(special_events)
+    if await block_is_finalized(mongomotor, grpcclient, net, height):
+        await redis.set(key, special_events_json)
+    return special_events_json
+
+
+async def get_block_chain_parameters_json(
+    redis, mongomotor: MongoMotor, grpcclient: GRPCClient, net: str, height: int
+) -> bytes | None:
+    """
+    Chain parameters for a block as JSON. They are the same for long runs of
+    blocks, so they are stored once per content hash, with a map from block
+    height to content hash. Only finalized blocks are cached.
+    """
+    content_hash = await redis.hget(chain_parameters_at_block_redis_key(net), height)
+    if content_hash is not None:
+        cached = await redis.hget(chain_parameters_redis_key(net), content_hash)
+        if cached is not None:
+            return cached
+
+    chain_parameters: CCD_ChainParameters = await asyncio.to_thread(
+        grpcclient.get_block_chain_parameters, height, net=NET(net)
+    )
+    if not chain_parameters:
+        return None
+
+    chain_parameters_json = chain_parameters.model_dump_json()
+    if await block_is_finalized(mongomotor, grpcclient, net, height):
+        content_hash = hashlib.sha256(chain_parameters_json.encode()).hexdigest()
+        await redis.hset(
+            chain_parameters_redis_key(net), content_hash, chain_parameters_json
+        )
+        await redis.hset(chain_parameters_at_block_redis_key(net), height, content_hash)
+    return chain_parameters_json.encode()
+
+
 @router.get("/{net}/block/{height}/special-events", response_class=JSONResponse)
 async def get_block_special_events(
     request: Request,
     net: str,
     height: int,
+    mongomotor: MongoMotor = Depends(get_mongo_motor),
     grpcclient: GRPCClient = Depends(get_grpcclient),
     api_key: str = Security(API_KEY_HEADER),
 ) -> list[CCD_BlockSpecialEvent]:
@@ -368,14 +453,59 @@ async def get_block_special_events(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    special_events = grpcclient.get_block_special_events(height, net=NET(net))
+    special_events_json = await get_block_special_events_json(
+        request.app.redis, mongomotor, grpcclient, net, height
+    )
+    return Response(content=special_events_json, media_type="application/json")
 
-    return special_events
-    # else:
-    #     raise HTTPException(
-    #         status_code=404,
-    #         detail=f"Can't retrieve special events for block at {height} on {net}",
-    #     )
+
+@router.get(
+    "/{net}/block/{height}/special-events/{skip}/{limit}", response_class=JSONResponse
+)
+async def get_block_special_events_paginated(
+    request: Request,
+    net: str,
+    height: int,
+    skip: int,
+    limit: int,
+    mongomotor: MongoMotor = Depends(get_mongo_motor),
+    grpcclient: GRPCClient = Depends(get_grpcclient),
+    api_key: str = Security(API_KEY_HEADER),
+) -> dict:
+    """
+    Endpoint to get a page of the special events for the given block, for payday
+    blocks with thousands of rewards.
+    """
+    if net not in ["mainnet", "testnet"]:
+        raise HTTPException(
+            status_code=404,
+            detail="Don't be silly. We only support mainnet and testnet.",
+        )
+
+    if skip < 0:
+        raise HTTPException(
+            status_code=400,
+            detail="Don't be silly. Skip must be greater than or equal to zero.",
+        )
+
+    if limit > 1000:
+        raise HTTPException(
+            status_code=400,
+            detail="Limit must be less than or equal to 1000.",
+        )
+
+    async def load():
+        return json.loads(
+            await get_block_special_events_json(
+                request.app.redis, mongomotor, grpcclient, net, height
+            )
+        )
+
+    special_events = await special_events_cache.get_or_load((net, height), load)
+    return {
+        "special_events": special_events[skip : skip + limit],
+        "total_special_events": len(special_events),
+    }
 
 
 @router.get("/{net}/block/{height}/chain-parameters", response_class=JSONResponse)
@@ -383,6 +513,7 @@ async def get_block_chain_parameters(
     request: Request,
     net: str,
     height: int,
+    mongomotor: MongoMotor = Depends(get_mongo_motor),
     grpcclient: GRPCClient = Depends(get_grpcclient),
     api_key: str = Security(API_KEY_HEADER),
 ) -> CCD_ChainParameters:
@@ -395,10 +526,12 @@ async def get_block_chain_parameters(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    chain_parameters = grpcclient.get_block_chain_parameters(height, net=NET(net))
+    chain_parameters_json = await get_block_chain_parameters_json(
+        request.app.redis, mongomotor, grpcclient, net, height
+    )
 
-    if chain_parameters:
-        return chain_parameters
+    if chain_parameters_json:
+        return Response(content=chain_parameters_json, media_type="application/json")
     else:
         raise HTTPException(
             status_code=404,
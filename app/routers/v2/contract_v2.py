@@ -1,10 +1,10 @@
+import asyncio
 from ccdexplorer_fundamentals.enums import NET
 from ccdexplorer_fundamentals.GRPCClient import GRPCClient
 from ccdexplorer_fundamentals.GRPCClient.CCD_Types import (
     CCD_ContractAddress,
     CCD_BlockItemSummary,
 )
-from ccdexplorer_fundamentals.GRPCClient.types_pb2 import VersionedModuleSource
 from ccdexplorer_fundamentals.cis import StandardIdentifiers, CIS
 from ccdexplorer_fundamentals.mongodb import (
     Collections,
@@ -12,13 +12,15 @@ from ccdexplorer_fundamentals.mongodb import (
 )
 from fastapi import APIRouter, Depends, HTTPException, Request, Security
 from app.ENV import API_KEY_HEADER
-from fastapi.responses import JSONResponse
-import json
-import base64
+from fastapi.responses import JSONResponse, Response
+import io
 from pymongo import DESCENDING
 from pydantic import BaseModel, ConfigDict
 
 
+from app.api_collections import CollectionsAPI, get_api_db
+from app.cache import LRUCache
+from app.module_sources import module_source_response_body, module_source_store
 from app.state_getters import get_grpcclient, get_mongo_motor
 
 router = APIRouter(tags=["Contract"], prefix="/v2")
@@ -45,17 +47,118 @@ class GetCIS5BalanceOfRequest(BaseModel):
     grpcclient: GRPCClient
 
 
+class InstanceMetadata(BaseModel):
+    name: str
+    module_name: str
+    version: str
+    source_module: str
+
+
+# instances are only ever changed by a contract upgrade (new source module),
+# so metadata can be kept for a long time. Unknown instances are cached
+# briefly, as they may show up in the next block.
+instance_metadata_cache = LRUCache(maxsize=25_000, ttl=60 * 60, negative_ttl=60)
+INSTANCE_METADATA_PROJECTION = {
+    "v0.name": 1,
+    "v0.source_module": 1,
+    "v1.name": 1,
+    "v1.source_module": 1,
+}
+
+
+def instance_metadata_from_document(result: dict | None) -> InstanceMetadata | None:
+    if not result:
+        return None
+    version = "v1" if result.get("v1") else "v0"
+    if not result.get(version):
+        return None
+    return InstanceMetadata(
+        name=result[version]["name"],
+        module_name=result[version]["name"].replace("init_", ""),
+        version=version,
+        source_module=result[version]["source_module"],
+    )
+
+
+def instance_metadata_cache_key(db_to_use, contract_address: CCD_ContractAddress | str):
+    """
+    The full name of the instances collection tells us the net, and is
+    the same for the sync and async drivers, so both share the cache.
+    """
+    if isinstance(contract_address, CCD_ContractAddress):
+        contract_address = contract_address.to_str()
+    return (db_to_use[Collections.instances].full_name, contract_address)
+
+
+async def get_instance_metadata(
+    db_to_use, contract_address: CCD_ContractAddress | str, refresh: bool = False
+) -> InstanceMetadata | None:
+    """
+    Set `refresh` to bypass the cache, for callers that must see an upgrade
+    (changed source module) immediately. The fresh result is cached again.
+    """
+    key = instance_metadata_cache_key(db_to_use, contract_address)
+    if refresh:
+        instance_metadata_cache.delete(key)
+
+    async def load():
+        result = await db_to_use[Collections.instances].find_one(
+            {"_id": key[1]}, INSTANCE_METADATA_PROJECTION
+        )
+        return instance_metadata_from_document(result)
+
+    return await instance_metadata_cache.get_or_load(key, load)
+
+
+def get_instance_metadata_sync(
+    db_to_use, contract_address: CCD_ContractAddress | str
+) -> InstanceMetadata | None:
+    key = instance_metadata_cache_key(db_to_use, contract_address)
+    if key in instance_metadata_cache:
+        return instance_metadata_cache.get(key)
+
+    result = db_to_use[Collections.instances].find_one(
+        {"_id": key[1]}, INSTANCE_METADATA_PROJECTION
+    )
+    metadata = instance_metadata_from_document(result)
+    instance_metadata_cache.set(key, metadata)
+    return metadata
+
+
+async def prefetch_instance_metadata(
+    db_to_use, contract_addresses: list[CCD_ContractAddress | str]
+) -> dict[str, InstanceMetadata | None]:
+    """
+    Fill the instance metadata cache for a list of contract addresses
+    with a single query for all addresses not already cached.
+    """
+    keys = {
+        key[1]: key
+        for key in [
+            instance_metadata_cache_key(db_to_use, x) for x in contract_addresses
+        ]
+    }
+    missing = [
+        address for address, key in keys.items() if key not in instance_metadata_cache
+    ]
+    if missing:
+        found = {
+            x["_id"]: instance_metadata_from_document(x)
+            for x in await db_to_use[Collections.instances]
+            .find({"_id": {"$in": missing}}, INSTANCE_METADATA_PROJECTION)
+            .to_list(length=None)
+        }
+        for address in missing:
+            instance_metadata_cache.set(keys[address], found.get(address))
+
+    return {address: instance_metadata_cache.get(key) for address, key in keys.items()}
+
+
 async def get_module_name_from_contract_address(
     db_to_use, contract_address: CCD_ContractAddress
-):
-    instance_result = await db_to_use[Collections.instances].find_one(
-        {"_id": contract_address.to_str()}
-    )
-    if "v1" in instance_result:
-        module_name = instance_result["v1"]["name"].replace("init_", "")
-    elif "v0" in instance_result:
-        module_name = instance_result["v1"]["name"].replace("init_", "")
-    return module_name
+) -> str | None:
+    metadata = await get_instance_metadata(db_to_use, contract_address)
+    return metadata.module_name if metadata else None
 
 
 async def get_balance_of(req: GetBalanceOfRequest):
@@ -109,14 +212,97 @@ async def get_cis5_balance_of(req: GetCIS5BalanceOfRequest):
 async def find_cis_standards_support(cis: CIS) -> list[StandardIdentifiers]:
     """
     This lists all Standards that are said to be supported.
+    All standards are queried in a single `supports` invoke.
     """
+    standards = list(reversed(StandardIdentifiers))
+    sp = io.BytesIO()
+    sp.write(len(standards).to_bytes(2, "little"))
+    for standard in standards:
+        sp.write(cis.standard_identifier(standard))
+
+    ii = cis.grpcclient.invoke_instance(
+        "last_final",
+        cis.instance_index,
+        cis.instance_subindex,
+        cis.entrypoint,
+        sp.getvalue(),
+        cis.net,
+    )
+    if ii.failure.used_energy > 0:
+        return []
+
+    bs = io.BytesIO(bytes.fromhex(ii.success.return_value.decode()))
+    if bs.getbuffer().nbytes == 0:
+        return []
+
     standards_supported = []
-    for standard in reversed(StandardIdentifiers):
-        if cis.supports_standards([standard]):
+    n = int.from_bytes(bs.read(2), byteorder="little")
+    for standard in standards[:n]:
+        support_result = int.from_bytes(bs.read(2), byteorder="little")
+        if support_result == 1:
             standards_supported.append(standard)
+        elif support_result == 2:
+            # supported through other contracts, skip over their addresses
+            for _ in range(int.from_bytes(bs.read(1), byteorder="little")):
+                cis.contract_address(bs)
     return standards_supported
 
 
+async def get_cis_standards_support(
+    mongomotor: MongoMotor,
+    grpcclient: GRPCClient,
+    net: str,
+    net_to_use: NET,
+    instance_address: str,
+) -> list[str] | None:
+    """
+    Supported standards are a property of the source module, so the result is
+    stored per instance together with the module ref it was determined for.
+    A contract upgrade changes the module ref, which invalidates the stored
+    result. Returns None if the instance doesn't exist.
+    """
+    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
+    collection = get_api_db(mongomotor, net)[CollectionsAPI.cis_standards_support.value]
+    # the module ref is read fresh (not from the instance metadata cache), so
+    # an upgrade is seen right away.
+    result, stored = await asyncio.gather(
+        db_to_use[Collections.instances].find_one(
+            {"_id": instance_address}, INSTANCE_METADATA_PROJECTION
+        ),
+        collection.find_one({"_id": instance_address}),
+    )
+    instance = instance_metadata_from_document(result)
+    if not instance:
+        return None
+    if stored and (stored["source_module"] == instance.source_module):
+        return stored["standards"]
+
+    # nothing stored yet, or the contract was upgraded, in which case the
+    # cached instance metadata is outdated as well.
+    instance_metadata_cache.set(
+        instance_metadata_cache_key(db_to_use, instance_address), instance
+    )
+
+    contract_address = CCD_ContractAddress.from_str(instance_address)
+    cis: CIS = CIS(
+        grpcclient,
+        contract_address.index,
+        contract_address.subindex,
+        f"{instance.module_name}.supports",
+        net_to_use,
+    )
+    standards = [x.value for x in await find_cis_standards_support(cis)]
+    await collection.replace_one(
+        {"_id": instance_address},
+        {
+            "source_module": instance.source_module,
+            "standards": standards,
+        },
+        upsert=True,
+    )
+    return standards
+
+
 @router.get(
     "/{net}/contract/{contract_index}/{contract_subindex}/schema-from-source",
     response_class=JSONResponse,
@@ -141,37 +327,17 @@ async def get_schema_from_source(
 
     db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
 
-    result = await db_to_use[Collections.instances].find_one(
-        {
-            "_id": CCD_ContractAddress.from_index(
-                contract_index, contract_subindex
-            ).to_str()
-        }
+    instance = await get_instance_metadata(
+        db_to_use, CCD_ContractAddress.from_index(contract_index, contract_subindex)
     )
-    if result:
-        module_ref = (
-            result["v1"]["source_module"]
-            if result.get("v1")
-            else result["v0"]["source_module"]
-        )
-        source_module_name = (
-            result["v1"]["name"][5:] if result.get("v1") else result["v0"]["name"][5:]
-        )
+    if instance:
+        module_ref = instance.source_module
+        source_module_name = instance.module_name
         try:
-            ms: VersionedModuleSource = grpcclient.get_module_source_original_classes(
-                module_ref, "last_final", net=NET(net)
-            )
-
-            version = "v1" if ms.v1 else "v0"
-            module_source = ms.v1.value if ms.v1 else ms.v0.value
-            return JSONResponse(
-                {
-                    "source_module_name": source_module_name,
-                    "module_source": json.dumps(
-                        base64.encodebytes(module_source).decode()
-                    ),
-                    "version": version,
-                }
+            module_source = await module_source_store.get(grpcclient, net, module_ref)
+            return Response(
+                content=module_source_response_body(module_source, source_module_name),
+                media_type="application/json",
             )
         except Exception as _:
             raise HTTPException(
@@ -314,24 +480,12 @@ async def get_instance_CIS_support(
     else:
         net_to_use = NET(net)
 
-    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
     instance_address = f"<{contract_index},{contract_subindex}>"
-    result = await db_to_use[Collections.instances].find_one({"_id": instance_address})
-    if result:
-        if result.get("v0"):
-            module_name = result["v0"]["name"][5:]
-        if result.get("v1"):
-            module_name = result["v1"]["name"][5:]
-        cis: CIS = CIS(
-            grpcclient,
-            contract_index,
-            contract_subindex,
-            f"{module_name}.supports",
-            net_to_use,
-        )
-        supports_cis_standard = cis.supports_standard(StandardIdentifiers(cis_standard))
-
-        return supports_cis_standard
+    supports_cis_standards = await get_cis_standards_support(
+        mongomotor, grpcclient, net, net_to_use, instance_address
+    )
+    if supports_cis_standards is not None:
+        return StandardIdentifiers(cis_standard).value in supports_cis_standards
     else:
         raise HTTPException(
             status_code=404,
@@ -366,23 +520,11 @@ async def get_instance_CIS_support_multiple(
     else:
         net_to_use = NET(net)
 
-    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
     instance_address = f"<{contract_index},{contract_subindex}>"
-    result = await db_to_use[Collections.instances].find_one({"_id": instance_address})
-    if result:
-        if result.get("v0"):
-            module_name = result["v0"]["name"][5:]
-        if result.get("v1"):
-            module_name = result["v1"]["name"][5:]
-        cis: CIS = CIS(
-            grpcclient,
-            contract_index,
-            contract_subindex,
-            f"{module_name}.supports",
-            net_to_use,
-        )
-        supports_cis_standards = await find_cis_standards_support(cis)
-        supports_cis_standards = [x.value for x in supports_cis_standards]
+    supports_cis_standards = await get_cis_standards_support(
+        mongomotor, grpcclient, net, net_to_use, instance_address
+    )
+    if supports_cis_standards is not None:
         return supports_cis_standards
     else:
         raise HTTPException(
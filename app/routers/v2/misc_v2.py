@@ -1,6 +1,7 @@
+import asyncio
+import datetime as dt
 from datetime import timedelta
 
-import dateutil
 from ccdexplorer_fundamentals.enums import NET
 from ccdexplorer_fundamentals.GRPCClient import GRPCClient
 from ccdexplorer_fundamentals.mongodb import (
@@ -10,8 +11,14 @@ from ccdexplorer_fundamentals.mongodb import (
 )
 from fastapi import APIRouter, Depends, HTTPException, Request, Security
 from app.ENV import API_KEY_HEADER
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from pymongo import ReplaceOne
+from app.api_collections import CollectionsAPI, get_api_db
+from app.cache import LRUCache
+from app.labels import LabelSnapshot, get_label_snapshot
+from app.projects import get_project_registry
 from app.state_getters import get_grpcclient, get_mongo_motor
+from app.statistics import get_statistics, statistics_to_columnar
 
 router = APIRouter(tags=["Misc"], prefix="/v2")
 
@@ -26,11 +33,13 @@ async def get_tx_data_for_project(
     project_id: str,
     start_date: str,
     end_date: str,
+    columnar: bool = False,
     mongomotor: MongoMotor = Depends(get_mongo_motor),
     api_key: str = Security(API_KEY_HEADER),
 ) -> JSONResponse:
     """
     Endpoint to get transactions counts for projects (and the chain).
+    With `columnar`, the result is returned as `dates` and one list per metric.
     """
     if net not in ["mainnet", "testnet"]:
         raise HTTPException(
@@ -38,20 +47,148 @@ async def get_tx_data_for_project(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    dates_to_include = generate_dates_from_start_until_end(start_date, end_date)
-    pipeline = [
-        {"$match": {"date": {"$in": dates_to_include}}},
-        {"$match": {"type": "statistics_transaction_types"}},
-        {"$match": {"project": project_id}},
-        {"$project": {"_id": 0, "type": 0, "usecase": 0}},
-        {"$sort": {"date": 1}},
-    ]
-    result = (
-        await mongomotor.mainnet[Collections.statistics]
-        .aggregate(pipeline)
-        .to_list(length=None)
+    try:
+        result = await get_statistics(
+            mongomotor,
+            "statistics_transaction_types",
+            start_date,
+            end_date,
+            project=project_id,
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=404,
+            detail="No valid date(s) given.",
+        )
+    return statistics_response(result, columnar)
+
+
+# reports for days that are not closed yet (or not yet stored).
+today_in_cache = LRUCache(maxsize=16, ttl=60)
+# nets for which the impacted addresses index was created by this process.
+today_in_indexes_created: set[str] = set()
+
+
+def today_in_report_is_final(report: dict) -> bool:
+    """
+    A report is final once its day has closed and is fully processed: the day
+    is in `blocks_per_day`, and the transaction type statistics (computed some
+    time after midnight) are in, or the day is more than a day ago.
+    """
+    today = dt.datetime.now().astimezone(dt.timezone.utc).date()
+    if "day_data" not in report or report["date"] >= f"{today:%Y-%m-%d}":
+        return False
+    return bool(report["tx_types"]) or (
+        report["date"] < f"{today - timedelta(days=1):%Y-%m-%d}"
+    )
+
+
+async def compute_today_in_report(mongomotor: MongoMotor, net: str, date: str) -> dict:
+    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
+
+    async def get_day_data() -> dict:
+        return_result = {}
+        result = await db_to_use[Collections.blocks_per_day].find_one({"date": date})
+        if result:
+            return_result["day_data"] = result
+
+            pipeline = [
+                {"$match": {"account_transaction": {"$exists": True}}},
+                {
+                    "$match": {
+                        "block_info.height": {
+                            "$gte": result["height_for_first_block"],
+                            "$lte": result["height_for_last_block"],
+                        }
+                    }
+                },
+                {
+                    "$group": {
+                        "_id": None,
+                        "tx_count": {"$count": {}},
+                        "fee_for_day": {"$sum": "$account_transaction.cost"},
+                    }
+                },
+            ]
+            result = (
+                await db_to_use[Collections.transactions]
+                .aggregate(pipeline)
+                .to_list(length=None)
+            )
+            return_result["tx_count"] = result[0]["tx_count"]
+            return_result["fee_for_day"] = result[0]["fee_for_day"]
+        return return_result
+
+    async def get_logged_events_by_contract() -> list:
+        pipeline = [
+            {"$match": {"tx_info.date": date}},
+            {"$group": {"_id": "$event_info.contract", "count": {"$count": {}}}},
+            {"$sort": {"count": -1}},
+        ]
+        return (
+            await db_to_use[Collections.tokens_logged_events_v2]
+            .aggregate(pipeline)
+            .to_list(length=None)
+        )
+
+    async def get_tx_types() -> dict:
+        pipeline = [
+            {"$match": {"date": date}},
+            {"$match": {"type": "statistics_transaction_types"}},
+            {"$match": {"project": "all"}},
+            {"$project": {"_id": 0, "type": 0, "usecase": 0}},
+            {"$sort": {"date": 1}},
+        ]
+        result = (
+            await mongomotor.mainnet[Collections.statistics]
+            .aggregate(pipeline)
+            .to_list(length=None)
+        )
+        if len(result) > 0:
+            if "tx_type_counts" in result[0]:
+                result = result[0]["tx_type_counts"]
+            else:
+                result = {}
+        else:
+            result = {}
+        return result
+
+    async def get_impacted_addresses() -> list:
+        pipeline = [
+            {"$match": {"date": date}},
+            {  # this filters out account rewards, as they are special events
+                "$match": {"tx_hash": {"$exists": True}},
+            },
+            {
+                "$group": {
+                    "_id": "$impacted_address_canonical",
+                    "count": {"$count": {}},
+                }
+            },
+            {"$sort": {"count": -1}},
+        ]
+        return (
+            await db_to_use[Collections.impacted_addresses]
+            .aggregate(pipeline)
+            .to_list(length=None)
+        )
+
+    # the aggregations are independent, so they run concurrently.
+    day_data, logged_events_by_contract, tx_types, impacted_addresses = (
+        await asyncio.gather(
+            get_day_data(),
+            get_logged_events_by_contract(),
+            get_tx_types(),
+            get_impacted_addresses(),
+        )
     )
-    return JSONResponse([x for x in result])
+    return {
+        "date": date,
+        **day_data,
+        "logged_events_by_contract": logged_events_by_contract,
+        "tx_types": tx_types,
+        "impacted_addresses": impacted_addresses,
+    }
 
 
 @router.get(
@@ -66,7 +203,8 @@ async def get_today_in_data(
     api_key: str = Security(API_KEY_HEADER),
 ) -> JSONResponse:
     """
-    Endpoint to get all interesting facts for this day.
+    Endpoint to get all interesting facts for this day. Reports for days
+    that have closed are stored and served from a single document read.
     """
     if net not in ["mainnet", "testnet"]:
         raise HTTPException(
@@ -74,92 +212,76 @@ async def get_today_in_data(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
+    stored = await get_stored_today_in_report(mongomotor, net, date)
+    if stored:
+        return stored
 
-    return_result = {"date": date}
+    async def load():
+        return await compute_today_in_report(mongomotor, net, date)
 
-    # day data
-    result = await db_to_use[Collections.blocks_per_day].find_one({"date": date})
-    if result:
-        return_result["day_data"] = result
+    return_result = await today_in_cache.get_or_load((net, date), load)
+    if today_in_report_is_final(return_result):
+        await store_today_in_report(mongomotor, net, return_result)
+    return return_result
 
-        pipeline = [
-            {"$match": {"account_transaction": {"$exists": True}}},
-            {
-                "$match": {
-                    "block_info.height": {
-                        "$gte": result["height_for_first_block"],
-                        "$lte": result["height_for_last_block"],
-                    }
-                }
-            },
-            {
-                "$group": {
-                    "_id": None,
-                    "tx_count": {"$count": {}},
-                    "fee_for_day": {"$sum": "$account_transaction.cost"},
-                }
-            },
-        ]
-        result = (
-            await db_to_use[Collections.transactions]
-            .aggregate(pipeline)
-            .to_list(length=None)
-        )
-        return_result["tx_count"] = result[0]["tx_count"]
-        return_result["fee_for_day"] = result[0]["fee_for_day"]
 
-    # logged events by contract
-    pipeline = [
-        {"$match": {"tx_info.date": date}},
-        {"$group": {"_id": "$event_info.contract", "count": {"$count": {}}}},
-        {"$sort": {"count": -1}},
-    ]
-    result = (
-        await db_to_use[Collections.tokens_logged_events_v2]
-        .aggregate(pipeline)
+async def get_stored_today_in_report(
+    mongomotor: MongoMotor, net: str, date: str
+) -> dict | None:
+    api_db = get_api_db(mongomotor, net)
+    stored = await api_db[CollectionsAPI.today_in_reports.value].find_one({"_id": date})
+    if not stored:
+        return None
+    if "impacted_addresses" in stored["report"]:
+        # stored before the impacted addresses had their own collection.
+        return stored["report"]
+    impacted_addresses = (
+        await api_db[CollectionsAPI.today_in_impacted_addresses.value]
+        .find({"date": date}, {"_id": 0, "impacted_address_canonical": 1, "count": 1})
+        .sort({"count": -1})
         .to_list(length=None)
     )
-    return_result["logged_events_by_contract"] = result
-
-    # tx types
-    pipeline = [
-        {"$match": {"date": date}},
-        {"$match": {"type": "statistics_transaction_types"}},
-        {"$match": {"project": "all"}},
-        {"$project": {"_id": 0, "type": 0, "usecase": 0}},
-        {"$sort": {"date": 1}},
-    ]
-    result = (
-        await mongomotor.mainnet[Collections.statistics]
-        .aggregate(pipeline)
-        .to_list(length=None)
-    )
-    if len(result) > 0:
-        if "tx_type_counts" in result[0]:
-            result = result[0]["tx_type_counts"]
-        else:
-            result = {}
-    else:
-        result = {}
-    return_result["tx_types"] = result
-
-    # impacted addresses
-    pipeline = [
-        {"$match": {"date": date}},
-        {  # this filters out account rewards, as they are special events
-            "$match": {"tx_hash": {"$exists": True}},
-        },
-        {"$group": {"_id": "$impacted_address_canonical", "count": {"$count": {}}}},
-        {"$sort": {"count": -1}},
-    ]
-    result = (
-        await db_to_use[Collections.impacted_addresses]
-        .aggregate(pipeline)
-        .to_list(length=None)
+    return {
+        **stored["report"],
+        "impacted_addresses": [
+            {"_id": x["impacted_address_canonical"], "count": x["count"]}
+            for x in impacted_addresses
+        ],
+    }
+
+
+async def store_today_in_report(mongomotor: MongoMotor, net: str, report: dict):
+    """
+    Impacted addresses are stored one document per address, as a busy day has
+    too many of them for a single document. The report itself is written last,
+    so it is only found once all its addresses are stored.
+    """
+    api_db = get_api_db(mongomotor, net)
+    date = report["date"]
+    impacted_addresses = api_db[CollectionsAPI.today_in_impacted_addresses.value]
+    if net not in today_in_indexes_created:
+        await impacted_addresses.create_index([("date", 1), ("count", -1)])
+        today_in_indexes_created.add(net)
+    if report["impacted_addresses"]:
+        await impacted_addresses.bulk_write(
+            [
+                ReplaceOne(
+                    {"_id": f"{date}-{x['_id']}"},
+                    {
+                        "date": date,
+                        "impacted_address_canonical": x["_id"],
+                        "count": x["count"],
+                    },
+                    upsert=True,
+                )
+                for x in report["impacted_addresses"]
+            ],
+            ordered=False,
+        )
+    report = {k: v for k, v in report.items() if k != "impacted_addresses"}
+    await api_db[CollectionsAPI.today_in_reports.value].replace_one(
+        {"_id": date}, {"_id": date, "report": report}, upsert=True
     )
-    return_result["impacted_addresses"] = result
-    return return_result
 
 
 @router.get(
@@ -269,6 +391,19 @@ async def get_identity_providers(
         )
 
 
+def label_snapshot_response(
+    request: Request, snapshot: LabelSnapshot, body: bytes
+) -> Response:
+    """
+    Serve a prebuilt label body with the snapshot version as ETag, and a 304
+    if the client already has this version.
+    """
+    etag = f'"{snapshot.version}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
 @router.get(
     "/{net}/misc/labeled-accounts",
     response_class=JSONResponse,
@@ -280,7 +415,7 @@ async def get_labeled_accounts(
     api_key: str = Security(API_KEY_HEADER),
 ) -> JSONResponse:
     """
-    Endpoint to get community labeled accounts.
+    Endpoint to get community labeled accounts, from the label snapshot.
     """
     if net not in ["mainnet", "testnet"]:
         raise HTTPException(
@@ -288,40 +423,8 @@ async def get_labeled_accounts(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    # labeled accounts only exist for mainnet
-    # db_to_use = mongomotor.mainnet
-    db_utilities = mongomotor.utilities
-
-    result = (
-        await db_utilities[CollectionsUtilities.labeled_accounts]
-        .find({})
-        .to_list(length=None)
-    )
-    labeled_accounts = {}
-    for r in result:
-        current_group = labeled_accounts.get(r["label_group"], {})
-        current_group[r["_id"]] = r["label"]
-        labeled_accounts[r["label_group"]] = current_group
-
-    result = (
-        await db_utilities[CollectionsUtilities.labeled_accounts_metadata]
-        .find({})
-        .to_list(length=None)
-    )
-
-    colors = {}
-    descriptions = {}
-    for r in result:
-        colors[r["_id"]] = r.get("color")
-        descriptions[r["_id"]] = r.get("description")
-
-    tags = {
-        "labels": labeled_accounts,
-        "colors": colors,
-        "descriptions": descriptions,
-    }
-
-    return JSONResponse(tags)
+    snapshot = await get_label_snapshot(mongomotor)
+    return label_snapshot_response(request, snapshot, snapshot.labeled_accounts_body)
 
 
 @router.get(
@@ -335,7 +438,7 @@ async def get_community_labeled_accounts(
     api_key: str = Security(API_KEY_HEADER),
 ) -> JSONResponse:
     """
-    Endpoint to get community labeled accounts (indexes).
+    Endpoint to get community labeled accounts (indexes), from the label snapshot.
     """
     if net not in ["mainnet", "testnet"]:
         raise HTTPException(
@@ -343,106 +446,14 @@ async def get_community_labeled_accounts(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    # labeled accounts only exist for mainnet
-    db_to_use = mongomotor.mainnet
-    db_utilities = mongomotor.utilities
-
-    result = (
-        await db_utilities[CollectionsUtilities.labeled_accounts]
-        .find({})
-        .to_list(length=None)
+    snapshot = await get_label_snapshot(mongomotor)
+    return label_snapshot_response(
+        request, snapshot, snapshot.community_labeled_accounts_body
     )
-    labeled_accounts = {}
-    for r in result:
-        current_group = labeled_accounts.get(r["label_group"], {})
-        if "account_index" in r:
-            current_group[r["account_index"]] = r["label"]
-        else:
-            current_group[r["_id"]] = r["label"]
-        labeled_accounts[r["label_group"]] = current_group
 
-    result = (
-        await db_utilities[CollectionsUtilities.labeled_accounts_metadata]
-        .find({})
-        .to_list(length=None)
-    )
 
-    colors = {}
-    descriptions = {}
-    for r in result:
-        colors[r["_id"]] = r.get("color")
-        descriptions[r["_id"]] = r.get("description")
-
-    ### insert projects into tags
-    # display_names
-    projects_display_names = {
-        x["_id"]: x["display_name"]
-        for x in await db_utilities[CollectionsUtilities.projects]
-        .find({})
-        .to_list(length=None)
-    }
-    # account addresses
-    project_account_addresses = (
-        await db_to_use[Collections.projects]
-        .find({"type": "account_address"})
-        .to_list(length=None)
-    )
-
-    dd = {}
-    for paa in project_account_addresses:
-        dd[paa["account_index"]] = projects_display_names[paa["project_id"]]
-    labeled_accounts["projects"] = dd
-
-    # contract addresses
-    project_contract_addresses = (
-        await db_to_use[Collections.projects]
-        .find({"type": "contract_address"})
-        .to_list(length=None)
-    )
-
-    dd = {}
-    for paa in project_contract_addresses:
-        dd[paa["contract_address"]] = projects_display_names[paa["project_id"]]
-    labeled_accounts["contracts"].update(dd)
-
-    labels_melt = {}
-    for label_group in labeled_accounts.keys():
-        label_group_color = colors[label_group]
-        for address, tag in labeled_accounts[label_group].items():
-            labels_melt[address] = {
-                "label": tag,
-                "group": label_group,
-                "color": label_group_color,
-            }
-
-    colors = {}
-    descriptions = {}
-    for r in result:
-        colors[r["_id"]] = r.get("color")
-        descriptions[r["_id"]] = r.get("description")
-
-    del labeled_accounts["projects"]
-    tags = {
-        "labels_melt": labels_melt,
-        "labeled_accounts": labeled_accounts,
-        "colors": colors,
-        "descriptions": descriptions,
-    }
-
-    return JSONResponse(tags)
-
-
-def generate_dates_from_start_until_end(start: str, end: str):
-    start_date = dateutil.parser.parse(start)
-    end_date = dateutil.parser.parse(end)
-    date_range = []
-
-    current_date = start_date
-    while current_date <= end_date:
-        date_range.append(current_date.strftime("%Y-%m-%d"))
-        current_date += timedelta(days=1)
-
-    return date_range
+def statistics_response(result: list[dict], columnar: bool) -> JSONResponse:
+    return JSONResponse(statistics_to_columnar(result) if columnar else result)
 
 
 @router.get(
@@ -455,11 +466,13 @@ async def get_tx_data_for_project(
     project_id: str,
     start_date: str,
     end_date: str,
+    columnar: bool = False,
     mongomotor: MongoMotor = Depends(get_mongo_motor),
     api_key: str = Security(API_KEY_HEADER),
 ) -> JSONResponse:
     """
     Endpoint to get transactions counts for projects (and the chain).
+    With `columnar`, the result is returned as `dates` and one list per metric.
     """
     if net not in ["mainnet", "testnet"]:
         raise HTTPException(
@@ -467,20 +480,20 @@ async def get_tx_data_for_project(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    dates_to_include = generate_dates_from_start_until_end(start_date, end_date)
-    pipeline = [
-        {"$match": {"date": {"$in": dates_to_include}}},
-        {"$match": {"type": "statistics_transaction_types"}},
-        {"$match": {"project": project_id}},
-        {"$project": {"_id": 0, "type": 0, "usecase": 0}},
-        {"$sort": {"date": 1}},
-    ]
-    result = (
-        await mongomotor.mainnet[Collections.statistics]
-        .aggregate(pipeline)
-        .to_list(length=None)
-    )
-    return JSONResponse([x for x in result])
+    try:
+        result = await get_statistics(
+            mongomotor,
+            "statistics_transaction_types",
+            start_date,
+            end_date,
+            project=project_id,
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=404,
+            detail="No valid date(s) given.",
+        )
+    return statistics_response(result, columnar)
 
 
 @router.get(
@@ -492,11 +505,13 @@ async def get_data_for_chain_analysis(
     net: str,
     start_date: str,
     end_date: str,
+    columnar: bool = False,
     mongomotor: MongoMotor = Depends(get_mongo_motor),
     api_key: str = Security(API_KEY_HEADER),
 ) -> JSONResponse:
     """
     Endpoint to get data for analysis.
+    With `columnar`, the result is returned as `dates` and one list per metric.
     """
     if net not in ["mainnet", "testnet"]:
         raise HTTPException(
@@ -504,20 +519,21 @@ async def get_data_for_chain_analysis(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    dates_to_include = generate_dates_from_start_until_end(start_date, end_date)
-    pipeline = [
-        {"$match": {"date": {"$in": dates_to_include}}},
-        {"$match": {"type": "statistics_transaction_types"}},
-        {"$match": {"project": "all"}},
-        {"$project": {"_id": 0, "type": 0, "usecase": 0, "project": 0}},
-        {"$sort": {"date": 1}},
-    ]
-    result = (
-        await mongomotor.mainnet[Collections.statistics]
-        .aggregate(pipeline)
-        .to_list(length=None)
-    )
-    return JSONResponse([x for x in result])
+    try:
+        result = await get_statistics(
+            mongomotor,
+            "statistics_transaction_types",
+            start_date,
+            end_date,
+            project="all",
+            exclude=("_id", "type", "usecase", "project"),
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=404,
+            detail="No valid date(s) given.",
+        )
+    return statistics_response(result, columnar)
 
 
 @router.get(
@@ -530,11 +546,13 @@ async def get_data_for_analysis(
     analysis: str,
     start_date: str,
     end_date: str,
+    columnar: bool = False,
     mongomotor: MongoMotor = Depends(get_mongo_motor),
     api_key: str = Security(API_KEY_HEADER),
 ) -> JSONResponse:
     """
     Endpoint to get data for analysis.
+    With `columnar`, the result is returned as `dates` and one list per metric.
     """
     if net not in ["mainnet", "testnet"]:
         raise HTTPException(
@@ -543,25 +561,13 @@ async def get_data_for_analysis(
         )
 
     try:
-        dates_to_include = generate_dates_from_start_until_end(start_date, end_date)
-    except:  # noqa: E722
+        result = await get_statistics(mongomotor, analysis, start_date, end_date)
+    except ValueError:
         raise HTTPException(
             status_code=404,
             detail="No valid date(s) given.",
         )
-
-    pipeline = [
-        {"$match": {"date": {"$in": dates_to_include}}},
-        {"$match": {"type": analysis}},
-        {"$project": {"_id": 0, "type": 0, "usecase": 0}},
-        {"$sort": {"date": 1}},
-    ]
-    result = (
-        await mongomotor.mainnet[Collections.statistics]
-        .aggregate(pipeline)
-        .to_list(length=None)
-    )
-    return JSONResponse([x for x in result])
+    return statistics_response(result, columnar)
 
 
 @router.get(
@@ -641,16 +647,8 @@ async def get_all_project_ids(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    project_ids = {}
-    result = (
-        await mongomotor.utilities[CollectionsUtilities.projects]
-        .find({})
-        .to_list(length=None)
-    )
-    for project in result:
-        project_ids[project["_id"]] = project
-
-    return project_ids
+    registry = await get_project_registry(mongomotor, net)
+    return registry.projects
 
 
 @router.get(
@@ -670,11 +668,8 @@ async def get_project_id(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    result = await mongomotor.utilities[CollectionsUtilities.projects].find_one(
-        {"_id": project_id}
-    )
-
-    return result
+    registry = await get_project_registry(mongomotor, net)
+    return registry.projects.get(project_id)
 
 
 @router.get(
@@ -694,14 +689,8 @@ async def get_project_addresses(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
-    project_addresses = (
-        await db_to_use[Collections.projects]
-        .find({"project_id": project_id})
-        .to_list(length=None)
-    )
-
-    return project_addresses
+    registry = await get_project_registry(mongomotor, net)
+    return registry.addresses_by_project.get(project_id, [])
 
 
 @router.get(
@@ -1,16 +1,16 @@
 from fastapi import APIRouter, Request, Depends, Security, HTTPException
 from app.ENV import API_KEY_HEADER
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from ccdexplorer_fundamentals.GRPCClient import GRPCClient
-from ccdexplorer_fundamentals.GRPCClient.types_pb2 import VersionedModuleSource
-from ccdexplorer_fundamentals.enums import NET
 from ccdexplorer_fundamentals.mongodb import (
     MongoMotor,
     Collections,
 )
+from app.api_collections import CollectionsAPI, get_api_db
+from app.module_schemas import DecodeRequest, decode_with_schema, module_schema_store
+from app.module_sources import module_source_response_body, module_source_store
+from app.rollups import rollup_is_caught_up
 from app.state_getters import get_mongo_motor, get_grpcclient
-import json
-import base64
 from ccdexplorer_fundamentals.GRPCClient.CCD_Types import CCD_BlockItemSummary
 
 router = APIRouter(tags=["Module"], prefix="/v2")
@@ -66,19 +66,181 @@ async def get_module_schema(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
-    ms: VersionedModuleSource = grpcclient.get_module_source_original_classes(
-        module_ref, "last_final", net=NET(net)
+    try:
+        module_source = await module_source_store.get(grpcclient, net, module_ref)
+    except Exception as _:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Requested module {module_ref} is not found on {net}.",
+        )
+
+    return Response(
+        content=module_source_response_body(module_source),
+        media_type="application/json",
     )
-    version = "v1" if ms.v1 else "v0"
-    module_source = ms.v1.value if ms.v1 else ms.v0.value
-    return JSONResponse(
-        {
-            "module_source": json.dumps(base64.encodebytes(module_source).decode()),
-            "version": version,
-        }
+
+
+async def get_parsed_module_schema(grpcclient: GRPCClient, net: str, module_ref: str):
+    try:
+        schema = await module_schema_store.get(grpcclient, net, module_ref)
+    except Exception as _:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Requested module {module_ref} is not found on {net}.",
+        )
+    if not schema:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Requested module {module_ref} has no embedded schema on {net}.",
+        )
+    return schema
+
+
+def decode_or_400(schema, req: DecodeRequest):
+    try:
+        return decode_with_schema(schema, req)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+
+@router.get(
+    "/{net}/module/{module_ref}/decode/parameter/{contract_name}/{function_name}/{data}",
+    response_class=JSONResponse,
+)
+async def decode_module_parameter(
+    request: Request,
+    net: str,
+    module_ref: str,
+    contract_name: str,
+    function_name: str,
+    data: str,
+    grpcclient: GRPCClient = Depends(get_grpcclient),
+    api_key: str = Security(API_KEY_HEADER),
+) -> JSONResponse:
+    """
+    Endpoint to decode a hex encoded parameter for a receive function with the embedded module schema.
+    """
+    if net not in ["mainnet", "testnet"]:
+        raise HTTPException(
+            status_code=404,
+            detail="Don't be silly. We only support mainnet and testnet.",
+        )
+
+    schema = await get_parsed_module_schema(grpcclient, net, module_ref)
+    return decode_or_400(
+        schema,
+        DecodeRequest(
+            kind="parameter",
+            contract_name=contract_name,
+            function_name=function_name,
+            data=data,
+        ),
+    )
+
+
+@router.get(
+    "/{net}/module/{module_ref}/decode/return-value/{contract_name}/{function_name}/{data}",
+    response_class=JSONResponse,
+)
+async def decode_module_return_value(
+    request: Request,
+    net: str,
+    module_ref: str,
+    contract_name: str,
+    function_name: str,
+    data: str,
+    grpcclient: GRPCClient = Depends(get_grpcclient),
+    api_key: str = Security(API_KEY_HEADER),
+) -> JSONResponse:
+    """
+    Endpoint to decode a hex encoded return value of a receive function with the embedded module schema.
+    """
+    if net not in ["mainnet", "testnet"]:
+        raise HTTPException(
+            status_code=404,
+            detail="Don't be silly. We only support mainnet and testnet.",
+        )
+
+    schema = await get_parsed_module_schema(grpcclient, net, module_ref)
+    return decode_or_400(
+        schema,
+        DecodeRequest(
+            kind="return_value",
+            contract_name=contract_name,
+            function_name=function_name,
+            data=data,
+        ),
     )
 
 
+@router.get(
+    "/{net}/module/{module_ref}/decode/event/{contract_name}/{data}",
+    response_class=JSONResponse,
+)
+async def decode_module_event(
+    request: Request,
+    net: str,
+    module_ref: str,
+    contract_name: str,
+    data: str,
+    grpcclient: GRPCClient = Depends(get_grpcclient),
+    api_key: str = Security(API_KEY_HEADER),
+) -> JSONResponse:
+    """
+    Endpoint to decode a hex encoded logged event with the embedded module schema.
+    """
+    if net not in ["mainnet", "testnet"]:
+        raise HTTPException(
+            status_code=404,
+            detail="Don't be silly. We only support mainnet and testnet.",
+        )
+
+    schema = await get_parsed_module_schema(grpcclient, net, module_ref)
+    return decode_or_400(
+        schema,
+        DecodeRequest(kind="event", contract_name=contract_name, data=data),
+    )
+
+
+@router.post(
+    "/{net}/module/{module_ref}/decode",
+    response_class=JSONResponse,
+)
+async def decode_module_batch(
+    request: Request,
+    net: str,
+    module_ref: str,
+    decode_requests: list[DecodeRequest],
+    grpcclient: GRPCClient = Depends(get_grpcclient),
+    api_key: str = Security(API_KEY_HEADER),
+) -> JSONResponse:
+    """
+    Endpoint to decode a batch of parameters, return values and events with the embedded module schema.
+    The schema is parsed once for the whole batch. Results are returned in request order,
+    with `decoded` set to `None` and an `error` for entries that could not be decoded.
+    """
+    if net not in ["mainnet", "testnet"]:
+        raise HTTPException(
+            status_code=404,
+            detail="Don't be silly. We only support mainnet and testnet.",
+        )
+
+    if len(decode_requests) > 1000:
+        raise HTTPException(
+            status_code=400,
+            detail="Batch size must be less than or equal to 1000.",
+        )
+
+    schema = await get_parsed_module_schema(grpcclient, net, module_ref)
+    results = []
+    for req in decode_requests:
+        try:
+            results.append({"decoded": decode_with_schema(schema, req), "error": None})
+        except ValueError as error:
+            results.append({"decoded": None, "error": str(error)})
+    return results
+
+
 @router.get(
     "/{net}/module/{module_ref}/instances/{skip}/{limit}",
     response_class=JSONResponse,
@@ -149,11 +311,14 @@ async def get_module_usage(
     request: Request,
     net: str,
     module_ref: str,
+    start_date: str | None = None,
+    end_date: str | None = None,
     mongodb: MongoMotor = Depends(get_mongo_motor),
     api_key: str = Security(API_KEY_HEADER),
 ) -> JSONResponse:
     """
     Endpoint to get usage over time for instances from module ref.
+    Optionally restricted to dates (YYYY-MM-DD) from `start_date` up to and including `end_date`.
     """
     if net not in ["mainnet", "testnet"]:
         raise HTTPException(
@@ -161,15 +326,43 @@ async def get_module_usage(
             detail="Don't be silly. We only support mainnet and testnet.",
         )
 
+    date_filter = {}
+    if start_date:
+        date_filter["$gte"] = start_date
+    if end_date:
+        date_filter["$lte"] = end_date
+
+    if await rollup_is_caught_up(
+        mongodb, net, CollectionsAPI.module_usage_per_day.value
+    ):
+        # the _id is `{module_ref}-{date}`, so a range on it uses the _id index.
+        query = {
+            "_id": {
+                "$gte": f"{module_ref}-{start_date or ''}",
+                "$lte": f"{module_ref}-{end_date or '9999-12-31'}",
+            }
+        }
+        result = (
+            await get_api_db(mongodb, net)[CollectionsAPI.module_usage_per_day.value]
+            .find(query, {"_id": 0, "date": 1, "count": 1})
+            .sort("_id", 1)
+            .to_list(length=None)
+        )
+        return [{"_id": x["date"], "count": x["count"]} for x in result]
+
+    # the rollup is still being built, so count from the source.
     db_to_use = mongodb.testnet if net == "testnet" else mongodb.mainnet
     module_instances_result = (
         await db_to_use[Collections.instances]
-        .find({"source_module": module_ref})
+        .find({"source_module": module_ref}, {"_id": 1})
         .to_list(length=None)
     )
     module_instances = [x["_id"] for x in module_instances_result]
+    match = {"impacted_address_canonical": {"$in": module_instances}}
+    if date_filter:
+        match["date"] = date_filter
     pipeline = [
-        {"$match": {"impacted_address_canonical": {"$in": module_instances}}},
+        {"$match": match},
         {"$group": {"_id": "$date", "count": {"$sum": 1}}},
         {"$sort": {"_id": 1}},
     ]
@@ -10,7 +10,6 @@ from ccdexplorer_fundamentals.GRPCClient.CCD_Types import (
 from ccdexplorer_fundamentals.mongodb import (
     Collections,
     MongoDB,
-    MongoTypeInstance,
 )
 
 from typing import Optional
@@ -19,6 +18,7 @@ from fastapi.responses import JSONResponse
 from pymongo import ASCENDING, DESCENDING
 from pydantic import BaseModel, Field
 from app.ENV import API_KEY_HEADER
+from app.routers.v2.contract_v2 import get_instance_metadata_sync
 from app.state_getters import (
     get_exchange_rates,
     get_grpcclient,
@@ -352,12 +352,11 @@ async def get_token_balances_for_public_key_from_smart_wallet_contract(
     instance_index = wallet_contract_address_index
     instance_subindex = wallet_contract_address_subindex
 
-    result = db_to_use[Collections.instances].find_one({"_id": wallet_contract_address})
-    instance = MongoTypeInstance(**result)
+    instance = get_instance_metadata_sync(db_to_use, wallet_contract_address)
 
-    if instance and instance.v1:
-        entrypoint = instance.v1.name[5:] + ".cis2BalanceOf"
-        entrypoint_ccd = instance.v1.name[5:] + ".ccdBalanceOf"
+    if instance and instance.version == "v1":
+        entrypoint = instance.module_name + ".cis2BalanceOf"
+        entrypoint_ccd = instance.module_name + ".ccdBalanceOf"
     else:
         return []
     ci = CIS(grpcclient, instance_index, instance_subindex, entrypoint, NET(net))
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, Request, Depends, HTTPException, Security
 from app.ENV import API_KEY_HEADER, MQTT_QOS
 from fastapi.responses import JSONResponse, RedirectResponse
@@ -18,6 +19,7 @@ from app.routers.v2.contract_v2 import (
     get_balance_of,
     GetBalanceOfRequest,
     get_module_name_from_contract_address,
+    prefetch_instance_metadata,
 )
 
 # from app.utils import TokenHolding
@@ -334,6 +336,7 @@ async def get_token_current_holders(
 
     token_id = "" if token_id == "_" else token_id
     token_address = f"<{contract_index},{contract_subindex}>-{token_id}"
+    contract = CCD_ContractAddress.from_index(contract_index, contract_subindex)
     db_to_use = mongomotor.testnet if net == "testnet" else mongomotor.mainnet
     try:
         pipeline = [
@@ -353,10 +356,11 @@ async def get_token_current_holders(
                 }
             },
         ]
-        result = (
-            await db_to_use[Collections.tokens_links_v3]
-            .aggregate(pipeline)
-            .to_list(limit)
+        # the module name is needed for balanceOf, so the instance metadata
+        # is fetched together with the holders.
+        result, _ = await asyncio.gather(
+            db_to_use[Collections.tokens_links_v3].aggregate(pipeline).to_list(limit),
+            prefetch_instance_metadata(db_to_use, [contract]),
         )
         current_holders = [x for x in result[0]["data"]]
         if "total" in result[0]:
@@ -370,7 +374,6 @@ async def get_token_current_holders(
 
     if result is not None:
         addresses = [x["account_address"] for x in current_holders]
-        contract = CCD_ContractAddress.from_index(contract_index, contract_subindex)
         module_name = await get_module_name_from_contract_address(db_to_use, contract)
         request = GetBalanceOfRequest(
             net=net,
@@ -0,0 +1,73 @@
+import datetime as dt
+
+import dateutil.parser
+from ccdexplorer_fundamentals.mongodb import Collections, MongoMotor
+
+from app.cache import LRUCache
+
+# windows that include the last days can still change, older windows can't.
+RECENT_WINDOW_TTL_IN_SECONDS = 300
+PAST_WINDOW_TTL_IN_SECONDS = 3600
+
+statistics_cache = LRUCache(maxsize=256)
+
+
+def normalize_date(date: str) -> str:
+    """
+    Parse a date and return it as `%Y-%m-%d`, the format of `date` in `statistics`.
+    Raises `ValueError` for dates that can't be parsed.
+    """
+    return f"{dateutil.parser.parse(date):%Y-%m-%d}"
+
+
+async def get_statistics(
+    mongomotor: MongoMotor,
+    statistics_type: str,
+    start_date: str,
+    end_date: str,
+    project: str | None = None,
+    exclude: tuple[str, ...] = ("_id", "type", "usecase"),
+) -> list[dict]:
+    """
+    Statistics documents of a type (and optionally a project) for a date range,
+    sorted on date. The range is a single scan on the (type, project, date) index,
+    which is managed by the service that writes `statistics`. Results are cached
+    per window.
+    """
+    start_date, end_date = normalize_date(start_date), normalize_date(end_date)
+    key = (statistics_type, project, start_date, end_date, exclude)
+    if key in statistics_cache:
+        return statistics_cache.get(key)
+
+    query = {"type": statistics_type, "date": {"$gte": start_date, "$lte": end_date}}
+    if project is not None:
+        query["project"] = project
+    result = (
+        await mongomotor.mainnet[Collections.statistics]
+        .find(query, {field: 0 for field in exclude})
+        .sort({"date": 1})
+        .to_list(length=None)
+    )
+
+    yesterday = dt.datetime.now().astimezone(dt.timezone.utc).date() - dt.timedelta(
+        days=1
+    )
+    ttl = (
+        RECENT_WINDOW_TTL_IN_SECONDS
+        if end_date >= f"{yesterday:%Y-%m-%d}"
+        else PAST_WINDOW_TTL_IN_SECONDS
+    )
+    statistics_cache.set(key, result, ttl=ttl)
+    return result
+
+
+def statistics_to_columnar(rows: list[dict]) -> dict[str, list]:
+    """
+    Turn statistics documents into columns: `dates` and one list per metric,
+    aligned with `dates`. A metric that is missing on a day is `None`.
+    """
+    metrics = list(dict.fromkeys(key for row in rows for key in row if key != "date"))
+    columns = {"dates": [row["date"] for row in rows]}
+    for metric in metrics:
+        columns[metric] = [row.get(metric) for row in rows]
+    return columns
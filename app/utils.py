@@ -13,3 +13,22 @@ class TokenHolding(BaseModel):
     token_value_USD: Optional[float] = None
     verified_information: Optional[dict] = None
     address_information: Optional[dict] = None
+
+
+class FlowEdge(BaseModel):
+    counterparty: str
+    amount: int
+    count: int
+    # only set for the `other` edge, the number of counterparties folded into it.
+    counterparties: Optional[int] = None
+
+
+class FlowGraph(BaseModel):
+    account: str
+    start_date: str
+    end_date: str
+    gte: int
+    inbound: list[FlowEdge]
+    outbound: list[FlowEdge]
+    total_inbound: int
+    total_outbound: int
@@ -0,0 +1,5 @@
+import os
+
+# app.ENV reads these at import time.
+os.environ.setdefault("MQTT_QOS", "0")
+os.environ.setdefault("LOGIN_SECRET", "test")
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from app.cache import LRUCache
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_released_when_the_load_is_cancelled():
+    cache = LRUCache()
+    started = asyncio.Event()
+
+    async def load():
+        started.set()
+        await asyncio.sleep(10)
+
+    loading = asyncio.create_task(cache.get_or_load("key", load))
+    await started.wait()
+    waiting = asyncio.create_task(cache.get_or_load("key", load))
+    await asyncio.sleep(0)
+    loading.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(waiting, timeout=1)
+    assert "key" not in cache
+
+
+@pytest.mark.asyncio
+async def test_a_cancelled_waiter_does_not_cancel_the_load():
+    cache = LRUCache()
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def load():
+        started.set()
+        await release.wait()
+        return 1
+
+    loading = asyncio.create_task(cache.get_or_load("key", load))
+    await started.wait()
+    waiting = asyncio.create_task(cache.get_or_load("key", load))
+    await asyncio.sleep(0)
+    waiting.cancel()
+    release.set()
+
+    assert await loading == 1
+    assert cache.get("key") == 1
@@ -0,0 +1,34 @@
+import pytest
+
+import app.projects as projects
+
+
+@pytest.mark.asyncio
+async def test_a_signalled_change_is_kept_until_a_load_succeeds(monkeypatch):
+    loads = []
+
+    def registry():
+        now = projects.dt.datetime.now().astimezone(projects.dt.timezone.utc)
+        return projects.ProjectRegistry({}, {}, {}, now)
+
+    async def load_project_registry(mongomotor, net):
+        loads.append(net)
+        if len(loads) == 1:
+            raise ConnectionError("mongo is down")
+        return registry()
+
+    monkeypatch.setattr(projects, "load_project_registry", load_project_registry)
+    # both registries are fresh, so only the signal makes them reload.
+    monkeypatch.setattr(
+        projects, "project_registries", {"mainnet": registry(), "testnet": registry()}
+    )
+    projects.mark_project_registries_stale()
+
+    with pytest.raises(ConnectionError):
+        await projects.refresh_project_registries(None)
+    await projects.refresh_project_registries(None)
+
+    assert loads == ["mainnet", "mainnet", "testnet"]
+    assert projects.project_registries_changes_loaded == (
+        projects.project_registries_changes
+    )
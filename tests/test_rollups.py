@@ -0,0 +1,348 @@
+from types import SimpleNamespace
+
+import pytest
+from pymongo import ReplaceOne, UpdateOne
+
+import app.rollups as rollups
+import app.routers.v2.account_v2 as account_v2
+from app.api_collections import CollectionsAPI
+from app.routers.v2.contract_v2 import InstanceMetadata
+
+
+class FakeCursor:
+    def __init__(self, result):
+        self.result = result
+
+    async def to_list(self, length=None):
+        return self.result
+
+
+class FakeCollection:
+    """
+    Just enough of a collection for the rollups: canned query results, and
+    bulk writes applied to an in-memory store.
+    """
+
+    def __init__(self, distinct=None, aggregate=None):
+        self.distinct_result = distinct or []
+        self.aggregate_result = aggregate or []
+        self.docs: dict = {}
+
+    async def distinct(self, key, query):
+        return self.distinct_result
+
+    def aggregate(self, pipeline):
+        return FakeCursor(self.aggregate_result)
+
+    async def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            doc = request._doc
+            if isinstance(request, ReplaceOne):
+                self.docs[request._filter["_id"]] = dict(doc)
+            elif isinstance(request, UpdateOne):
+                assert set(doc) <= {"$set", "$setOnInsert"}, doc
+                current = self.docs.setdefault(request._filter["_id"], {})
+                current.update(doc.get("$set", {}))
+
+
+def field_value(doc: dict, path: str):
+    for part in path.split("."):
+        doc = (doc or {}).get(part)
+    return doc
+
+
+def matches(doc: dict, query: dict) -> bool:
+    operators = {
+        "$eq": lambda a, b: a == b,
+        "$in": lambda a, b: a in b,
+        "$gte": lambda a, b: a is not None and a >= b,
+        "$lte": lambda a, b: a is not None and a <= b,
+        "$lt": lambda a, b: a is not None and a < b,
+        "$gt": lambda a, b: a is not None and a > b,
+        "$ne": lambda a, b: a != b,
+        "$exists": lambda a, b: (a is not None) == b,
+    }
+    for key, condition in query.items():
+        value = field_value(doc, key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        if not all(operators[op](value, arg) for op, arg in condition.items()):
+            return False
+    return True
+
+
+class MemoryCollection(FakeCollection):
+    """
+    A collection that answers the queries used by the rewards rollup and its
+    readers from the documents it holds.
+    """
+
+    def __init__(self, docs: list[dict] | None = None):
+        super().__init__()
+        self.docs = {doc.get("_id", i): doc for i, doc in enumerate(docs or [])}
+
+    def find(self, query):
+        return FakeCursor([x for x in self.docs.values() if matches(x, query)])
+
+    async def find_one(self, query, sort=None):
+        result = [x for x in self.docs.values() if matches(x, query)]
+        for key, direction in reversed(sort or []):
+            result.sort(key=lambda x: x[key], reverse=direction < 0)
+        return result[0] if result else None
+
+    def aggregate(self, pipeline):
+        result = list(self.docs.values())
+        for stage in pipeline:
+            (op, arg), *_ = stage.items()
+            if op == "$match":
+                result = [x for x in result if matches(x, arg)]
+            elif op == "$sort":
+                for key, direction in reversed(list(arg.items())):
+                    result.sort(
+                        key=lambda x: field_value(x, key), reverse=direction < 0
+                    )
+            elif op == "$group":
+                result = self.group(result, arg)
+        return FakeCursor(result)
+
+    @staticmethod
+    def group(docs: list[dict], spec: dict) -> list[dict]:
+        def evaluate(doc, expression):
+            if isinstance(expression, dict):
+                return {k: evaluate(doc, v) for k, v in expression.items()}
+            if expression is None:
+                return None
+            if expression == "$$ROOT":
+                return doc
+            return field_value(doc, expression[1:])
+
+        groups = {}
+        for doc in docs:
+            group_id = evaluate(doc, spec["_id"])
+            group = groups.setdefault(repr(group_id), {"_id": group_id})
+            for name, accumulator in spec.items():
+                if name == "_id":
+                    continue
+                (op, expression), *_ = accumulator.items()
+                value = evaluate(doc, expression)
+                if op == "$sum":
+                    group[name] = group.get(name, 0) + (value or 0)
+                elif op == "$min":
+                    group[name] = min(group.get(name, value), value)
+                elif op == "$first":
+                    group.setdefault(name, value)
+        return list(groups.values())
+
+    async def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            assert isinstance(request, ReplaceOne)
+            self.docs[request._filter["_id"]] = dict(request._doc)
+
+
+class FakeDB(dict):
+    def __missing__(self, key):
+        self[key] = FakeCollection()
+        return self[key]
+
+
+class FakeMotor:
+    def __init__(self):
+        self.mainnet = FakeDB()
+        self.testnet = FakeDB()
+        self.mainnet_db = FakeDB()
+        self.testnet_db = FakeDB()
+
+
+@pytest.mark.asyncio
+async def test_module_usage_range_processed_twice_gives_the_same_counts(
+    monkeypatch,
+):
+    instances = {
+        "<1,0>": InstanceMetadata(
+            name="a", module_name="a", version="v1", source_module="m1"
+        ),
+        "<2,0>": InstanceMetadata(
+            name="b", module_name="b", version="v1", source_module="m1"
+        ),
+        "<3,0>": InstanceMetadata(
+            name="c", module_name="c", version="v1", source_module="m2"
+        ),
+    }
+
+    async def prefetch_instance_metadata(db_to_use, addresses):
+        return {x: instances.get(x) for x in addresses}
+
+    monkeypatch.setattr(
+        rollups, "prefetch_instance_metadata", prefetch_instance_metadata
+    )
+
+    motor = FakeMotor()
+    motor.mainnet[rollups.Collections.impacted_addresses] = FakeCollection(
+        distinct=["2024-01-01", "2024-01-02"],
+        aggregate=[
+            {"_id": {"address": "<1,0>", "date": "2024-01-01"}, "count": 3},
+            {"_id": {"address": "<2,0>", "date": "2024-01-01"}, "count": 2},
+            {"_id": {"address": "<3,0>", "date": "2024-01-02"}, "count": 7},
+            {"_id": {"address": "<9,0>", "date": "2024-01-02"}, "count": 1},
+        ],
+    )
+    usage = motor.mainnet_db[CollectionsAPI.module_usage_per_day.value]
+
+    await rollups.update_module_usage_per_day(motor, "mainnet", 100, 200)
+    first_pass = {k: dict(v) for k, v in usage.docs.items()}
+    await rollups.update_module_usage_per_day(motor, "mainnet", 100, 200)
+
+    assert usage.docs == first_pass
+    assert usage.docs["m1-2024-01-01"]["count"] == 5
+    assert usage.docs["m2-2024-01-02"]["count"] == 7
+
+
+ACCOUNT = "3BFChzvx3783jGUKgHVCanFVxyDA"
+# blocks 1-10 are on 2024-01-01, 11-20 on 2024-01-02, 21-30 on 2024-01-03.
+BLOCKS_PER_DAY = {
+    f"2024-01-0{day}": SimpleNamespace(
+        height_for_first_block=10 * day - 9, height_for_last_block=10 * day
+    )
+    for day in [1, 2, 3]
+}
+
+
+def account_reward(block_height: int, baker_reward: int) -> dict:
+    return {
+        "impacted_address": ACCOUNT,
+        "impacted_address_canonical": ACCOUNT,
+        "effect_type": "Account Reward",
+        "block_height": block_height,
+        "date": f"2024-01-0{(block_height + 9) // 10}",
+        "balance_movement": {
+            "baker_reward": baker_reward,
+            "finalization_reward": 1,
+            "transaction_fee_reward": 2,
+        },
+    }
+
+
+def account_rewards_motor() -> FakeMotor:
+    motor = FakeMotor()
+    motor.mainnet[rollups.Collections.impacted_addresses] = MemoryCollection(
+        [account_reward(x, x * 100) for x in [5, 15, 18, 25]]
+    )
+    motor.mainnet[rollups.Collections.impacted_addresses_pre_payday] = MemoryCollection(
+        [
+            {
+                "impacted_address_canonical": ACCOUNT,
+                "sum_baker_reward": 1_000,
+                "sum_finalization_reward": 10,
+                "sum_transaction_fee_reward": 20,
+            }
+        ]
+    )
+    motor.mainnet_db[CollectionsAPI.account_rewards_per_day.value] = MemoryCollection()
+    return motor
+
+
+async def account_rewards_total(
+    motor: FakeMotor, start_date: str, end_date: str, state: dict
+) -> int:
+    motor.mainnet_db[CollectionsAPI.rollup_state.value] = MemoryCollection(
+        [{"_id": CollectionsAPI.account_rewards_per_day.value, **state}]
+    )
+    return await account_v2.get_account_rewards_for_flow_graph(
+        None,
+        "mainnet",
+        ACCOUNT,
+        start_date,
+        end_date,
+        mongomotor=motor,
+        blocks_per_day=BLOCKS_PER_DAY,
+    )
+
+
+WINDOWS = [
+    ("2024-01-01", "2024-01-03"),
+    ("2024-01-03", "2024-01-03"),
+    ("2024-01-04", "2024-01-04"),
+    ("2024-01-02", "2024-01-02"),
+]
+
+
+@pytest.mark.asyncio
+async def test_account_rewards_from_rollup_equal_rewards_from_source():
+    motor = account_rewards_motor()
+    rows = motor.mainnet_db[CollectionsAPI.account_rewards_per_day.value]
+
+    # the second range starts halfway 2024-01-02 and is processed twice.
+    await rollups.update_account_rewards_per_day(motor, "mainnet", 1, 16)
+    await rollups.update_account_rewards_per_day(motor, "mainnet", 17, 30)
+    first_pass = {k: dict(v) for k, v in rows.docs.items()}
+    await rollups.update_account_rewards_per_day(motor, "mainnet", 17, 30)
+    assert rows.docs == first_pass
+
+    rollup = {"block_height": 30, "caught_up": True}
+    source = {"block_height": -1, "caught_up": False}
+    for start_date, end_date in WINDOWS:
+        assert await account_rewards_total(
+            motor, start_date, end_date, rollup
+        ) == await account_rewards_total(motor, start_date, end_date, source)
+    # all rewards, and pre-payday rewards when no rewards fall in the range.
+    assert (
+        await account_rewards_total(motor, "2024-01-01", "2024-01-03", rollup)
+        == 1_030 + 6_300 + 4 * 3
+    )
+    assert await account_rewards_total(motor, "2024-01-05", "2024-01-05", rollup) == (
+        1_030
+    )
+
+
+@pytest.mark.asyncio
+async def test_account_rewards_above_the_high_water_mark_come_from_source():
+    motor = account_rewards_motor()
+    await rollups.update_account_rewards_per_day(motor, "mainnet", 1, 16)
+
+    rollup = {"block_height": 16, "caught_up": True}
+    source = {"block_height": -1, "caught_up": False}
+    for start_date, end_date in WINDOWS:
+        assert await account_rewards_total(
+            motor, start_date, end_date, rollup
+        ) == await account_rewards_total(motor, start_date, end_date, source)
+
+
+def account_creation(address: str, block_height: int) -> dict:
+    return {
+        "_id": f"tx-{address}",
+        "hash": f"tx-{address}",
+        "block_info": {
+            "height": block_height,
+            "hash": f"block-{block_height}",
+            "slot_time": "2024-01-01T00:00:00Z",
+        },
+        "account_creation": {"credential_type": 1, "address": address, "reg_id": ""},
+    }
+
+
+@pytest.mark.asyncio
+async def test_account_creations_include_accounts_above_the_high_water_mark():
+    motor = FakeMotor()
+    motor.mainnet[rollups.Collections.transactions] = MemoryCollection(
+        [account_creation("old", 5), account_creation("new", 25)]
+    )
+    motor.mainnet_db[CollectionsAPI.rollup_state.value] = MemoryCollection(
+        [
+            {
+                "_id": CollectionsAPI.account_creations.value,
+                "block_height": 20,
+                "caught_up": True,
+            }
+        ]
+    )
+    motor.mainnet_db[CollectionsAPI.account_creations.value] = MemoryCollection(
+        [{"_id": "old", "tx_hash": "tx-old", "block_height": 5}]
+    )
+
+    result = await account_v2.get_account_creation_txs(
+        motor, "mainnet", ["old", "new", "genesis"]
+    )
+
+    assert result["old"].hash == "tx-old"
+    assert result["new"].hash == "tx-new"
+    assert result["genesis"] is None